@@ -0,0 +1,661 @@
+"""Capa de persistencia de la porra.
+
+Una sola interfaz (`Almacen`) con dos motores:
+  * `AlmacenSheets`: la hoja de Google "Base de Datos F1 2026" (producción).
+  * `AlmacenSQLite`: base local indexada, para desarrollo, pruebas y benchmarks.
+
+Este módulo no importa Streamlit: las credenciales se reciben como parámetro.
+"""
+import re
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+
+import pandas as pd
+
+from cliente_sheets import ERRORES_SHEETS, UnVuelo, obtener_cliente
+
+# --- HOJAS Y COLUMNAS ---
+HOJA_USUARIOS = "usuarios"
+HOJA_CALENDARIO = "calendario"
+HOJA_CARRERA = "pronosticos_carrera"
+HOJA_MUNDIAL = "pronosticos_mundial"
+HOJA_RESULTADOS = "resultados_oficiales"
+
+COLUMNAS = {
+    HOJA_USUARIOS: ["usuario", "password", "rol", "liga_privada"],
+    HOJA_CALENDARIO: ["id_evento", "nombre_mostrar", "fecha_limite"],
+    HOJA_CARRERA: ["usuario", "carrera", "fecha", "datos_encriptados"],
+    HOJA_MUNDIAL: ["usuario", "tipo", "fecha", "datos_encriptados"],
+    HOJA_RESULTADOS: ["carrera"] + [f"p{i}" for i in range(1, 23)] + ["oficial"],
+}
+
+# Columna que identifica el evento en cada hoja de apuestas
+COLUMNA_EVENTO = {HOJA_CARRERA: "carrera", HOJA_MUNDIAL: "tipo"}
+
+NOMBRE_LIBRO = "Base de Datos F1 2026"
+
+# Lo que puede lanzar una lectura cuando la fuente falla (y no hay copia a la que volver)
+ERRORES_ALMACEN = ERRORES_SHEETS + (sqlite3.Error, OSError)
+
+
+def hoja_apuestas(tipo_apuesta):
+    """'mundial' -> pronosticos_mundial, cualquier otro -> pronosticos_carrera"""
+    return HOJA_MUNDIAL if tipo_apuesta == "mundial" else HOJA_CARRERA
+
+
+class Almacen(ABC):
+    """Interfaz común. Los métodos de escritura lanzan excepción si fallan.
+
+    Un motor al que le falte algún método abstracto no se puede instanciar.
+    """
+
+    # Lectura
+    @abstractmethod
+    def leer_hoja(self, hoja):
+        """Devuelve la hoja completa como DataFrame (equivale a get_all_records)."""
+
+    def sincronizar_hoja(self, hoja, epoca=None):
+        """Como leer_hoja, pero el motor puede traer solo lo que ha cambiado desde la
+        última llamada. Un cambio de `epoca` fuerza una recarga completa."""
+        return self.leer_hoja(hoja)
+
+    def leer_hojas(self, hojas):
+        """{hoja: DataFrame} de varias hojas. Un motor remoto las pide en una sola llamada."""
+        return {hoja: self.leer_hoja(hoja) for hoja in hojas}
+
+    def sincronizar_hojas(self, hojas, epoca=None):
+        """Como leer_hojas, con la semántica de sincronizar_hoja."""
+        return {hoja: self.sincronizar_hoja(hoja, epoca) for hoja in hojas}
+
+    @abstractmethod
+    def ligas_usuario(self, usuario):
+        """Texto de 'liga_privada' del usuario ('' si no tiene, None si no existe)."""
+
+    # Escritura
+    @abstractmethod
+    def anadir_usuario(self, usuario, password, rol, ligas):
+        """Añade un usuario al final de la hoja."""
+
+    def actualizar_rol(self, usuario, rol):
+        self.actualizar_roles({usuario: rol})
+
+    @abstractmethod
+    def actualizar_roles(self, roles):
+        """Cambia el rol de varios usuarios {usuario: rol} de una vez."""
+
+    @abstractmethod
+    def actualizar_ligas(self, usuario, ligas):
+        """Sustituye el texto de 'liga_privada' del usuario."""
+
+    def borrar_usuario(self, usuario):
+        self.borrar_usuarios([usuario])
+
+    @abstractmethod
+    def borrar_usuarios(self, usuarios):
+        """Borra varios usuarios de una vez (los que no existan se ignoran)."""
+
+    def guardar_apuesta(self, hoja, usuario, id_evento, fecha, datos):
+        """Inserta o sustituye la apuesta de (usuario, evento)."""
+        self.guardar_apuestas_lote(hoja, [(usuario, id_evento, fecha, datos)])
+
+    @abstractmethod
+    def guardar_apuestas_lote(self, hoja, filas):
+        """Upsert de varias apuestas [(usuario, id_evento, fecha, datos)] con claves únicas."""
+
+    def guardar_resultado(self, fila):
+        """Inserta o sustituye el resultado oficial de un evento (fila[0])."""
+        self.guardar_resultados_lote([fila])
+
+    @abstractmethod
+    def guardar_resultados_lote(self, filas):
+        """Upsert de varios resultados [[carrera, p1..p22, oficial]] por id de evento.
+        Si un evento se repite en filas, manda la última."""
+
+
+def ajustar_resultado(fila):
+    """Fila de resultados_oficiales con exactamente sus columnas, como texto."""
+    n = len(COLUMNAS[HOJA_RESULTADOS])
+    return ([str(v) for v in fila] + [""] * n)[:n]
+
+
+def _por_evento(filas):
+    """Filas de resultados sin eventos repetidos (manda la última), en su orden."""
+    ultimas = {}
+    for fila in filas:
+        fila = ajustar_resultado(fila)
+        ultimas.pop(fila[0], None)
+        ultimas[fila[0]] = fila
+    return list(ultimas.values())
+
+
+# ==========================================
+#              MOTOR GOOGLE SHEETS
+# ==========================================
+# Nº de columnas (desde la A) que forman la clave de fila de cada hoja
+COLUMNAS_CLAVE = {HOJA_USUARIOS: 1, HOJA_CARRERA: 2, HOJA_MUNDIAL: 2, HOJA_RESULTADOS: 1}
+
+# Hojas en las que, si una clave se repite, manda la última fila (un resultado
+# corregido con el append de antes); en el resto manda la primera
+ULTIMA_GANA = {HOJA_RESULTADOS}
+
+# Más filas que esto a verificar en una escritura: sale más barato recargar la hoja entera
+_MAX_VERIFICACIONES = 50
+
+# La sincronización incremental recarga entera cada este tiempo (s) para recoger
+# reescrituras hechas por otros procesos
+INTERVALO_RECARGA_COMPLETA = 600
+
+_RE_RANGO = re.compile(r"![A-Z]+(\d+)")
+_RE_FILA = re.compile(r"[A-Z]+(\d+)")
+
+
+def _fuera_de_rejilla(error):
+    """400 al leer: el rango empieza más allá de la última fila de la hoja (que encogió)."""
+    return getattr(error, "code", None) == 400
+
+
+def _letra(n):
+    return chr(ord("A") + n - 1)
+
+
+def _rango(hoja, a1=None):
+    """Rango A1 con el nombre de la pestaña entrecomillado: 'hoja' o 'hoja'!A1:B."""
+    nombre = "'" + hoja.replace("'", "''") + "'"
+    return f"{nombre}!{a1}" if a1 else nombre
+
+
+def _rellenar(valores):
+    """Iguala el ancho de las filas: la API recorta las celdas vacías del final."""
+    ancho = max((len(f) for f in valores), default=0)
+    return [list(f) + [""] * (ancho - len(f)) for f in valores]
+
+
+def _a_dataframe(valores):
+    if not valores: return pd.DataFrame()
+    return pd.DataFrame(valores[1:], columns=valores[0])
+
+
+def _fila_inicial(respuesta):
+    """Primera fila escrita por un append_row(s), según la respuesta de la API."""
+    try: return int(_RE_RANGO.search(respuesta["updates"]["updatedRange"]).group(1))
+    except (TypeError, KeyError, AttributeError): return None
+
+
+class IndiceFilas:
+    """Clave -> nº de fila en la hoja (la 1 es la cabecera), mantenido en memoria.
+
+    Se construye con la descarga completa de la hoja, se actualiza en cada alta y
+    baja (una baja desplaza las filas de debajo) y se comprueba contra la hoja
+    antes de cada escritura.
+    """
+
+    def __init__(self, n_clave, ultima_gana=False):
+        self.n_clave = n_clave
+        self.ultima_gana = ultima_gana
+        self.filas = {}
+        self.ultima = 0           # última fila ocupada
+        self.cargado = False
+
+    def clave(self, valores):
+        valores = [str(v) for v in valores[:self.n_clave]]
+        return tuple(valores + [""] * (self.n_clave - len(valores)))
+
+    def cargar(self, valores):
+        self.filas = {}
+        orden = range(1, len(valores)) if self.ultima_gana else range(len(valores) - 1, 0, -1)
+        for i in orden:     # se queda la última asignada
+            self.filas[self.clave(valores[i])] = i + 1
+        self.ultima = len(valores)
+        self.cargado = True
+
+    def anadir(self, primera_fila, filas_valores):
+        for k, valores in enumerate(filas_valores):
+            if self.ultima_gana: self.filas[self.clave(valores)] = primera_fila + k
+            else: self.filas.setdefault(self.clave(valores), primera_fila + k)
+        self.ultima = max(self.ultima, primera_fila + len(filas_valores) - 1)
+
+    def borrar(self, fila):
+        self.filas = {c: f - 1 if f > fila else f for c, f in self.filas.items() if f != fila}
+        self.ultima -= 1
+
+
+class _Instantanea:
+    """Última copia descargada de una hoja, base de la sincronización incremental."""
+
+    def __init__(self, valores, epoca):
+        self.cabecera = list(valores[0]) if valores else []
+        self.df = _a_dataframe(valores)
+        self.filas = len(valores)                       # incluida la cabecera
+        self.ultima = list(valores[-1]) if valores else []
+        self.epoca = epoca
+        self.momento = time.monotonic()
+
+    def ajustar(self, valores):
+        valores = [str(v) for v in valores[:len(self.cabecera)]]
+        return valores + [""] * (len(self.cabecera) - len(valores))
+
+
+class AlmacenSheets(Almacen):
+    """Usa el cliente compartido del proceso (ver cliente_sheets) y un índice de filas por hoja.
+
+    `cliente` permite inyectar otro objeto con la interfaz de ClienteSheets
+    (p.ej. el Sheets falso de benchmarks/).
+    """
+
+    def __init__(self, creds_dict, nombre_libro=NOMBRE_LIBRO, cuota_por_minuto=60, cliente=None):
+        self.creds_dict = creds_dict
+        self.nombre_libro = nombre_libro
+        self.cuota_por_minuto = cuota_por_minuto
+        self._vuelos = UnVuelo()
+        self._ultima_buena = {}   # hoja -> último DataFrame leído con éxito
+        self._indices = {hoja: IndiceFilas(n, hoja in ULTIMA_GANA) for hoja, n in COLUMNAS_CLAVE.items()}
+        self._locks = {hoja: threading.RLock() for hoja in COLUMNAS_CLAVE}
+        self._instantaneas = {}
+        self._reescritas = {}     # hoja -> filas reescritas por este proceso desde la última sincronización
+        self._lock_sync = threading.Lock()
+        self._lock_instantaneas = threading.Lock()
+        self._cliente = cliente
+
+    @property
+    def cliente(self):
+        if self._cliente is not None: return self._cliente
+        return obtener_cliente(self.creds_dict, self.nombre_libro, self.cuota_por_minuto)
+
+    def _en_hoja(self, hoja, operacion):
+        return self.cliente.ejecutar(hoja, operacion)
+
+    def _cargar_indice(self, ws, hoja):
+        valores = ws.get_all_values()
+        self._indices[hoja].cargar(valores)
+        return valores
+
+    def _localizar(self, ws, hoja, claves, ultima_col=None):
+        """{clave: (fila, valores)} de las claves que existen en la hoja.
+
+        Una sola lectura por lotes sirve para comprobar las filas del índice y,
+        de paso, recoger las filas que otro proceso haya añadido al final. Si
+        algo no cuadra (p.ej. un borrado desde fuera), se recarga el índice.
+        """
+        indice = self._indices[hoja]
+        ultima_col = ultima_col or _letra(indice.n_clave)
+        claves = set(claves)
+        if not indice.cargado: self._cargar_indice(ws, hoja)
+        for _ in range(2):
+            filas = {c: indice.filas[c] for c in claves if c in indice.filas}
+            if len(filas) > _MAX_VERIFICACIONES:
+                self._cargar_indice(ws, hoja)
+                return {c: (indice.filas[c], list(c)) for c in claves if c in indice.filas}
+            # La cola empieza en la última fila conocida: pedir desde la siguiente
+            # falla si la rejilla de la hoja no tiene más filas
+            inicio = max(indice.ultima, 1)
+            try:
+                leidos = ws.batch_get([f"A{inicio}:{ultima_col}"] + [f"A{f}:{ultima_col}{f}" for f in filas.values()])
+            except Exception as e:
+                if not _fuera_de_rejilla(e): raise
+                self._cargar_indice(ws, hoja)
+                continue
+            encontrados, correcto = {}, True
+            for (c, f), valores in zip(filas.items(), leidos[1:]):
+                valores = list(valores[0]) if valores else []
+                if indice.clave(valores) != c:
+                    correcto = False
+                    break
+                encontrados[c] = (f, valores)
+            nuevas = [list(v) for v in leidos[0]][1 if indice.ultima else 0:]
+            if correcto:
+                primera = indice.ultima + 1
+                indice.anadir(primera, nuevas)
+                for k, valores in enumerate(nuevas):
+                    c = indice.clave(valores)
+                    if c in claves and indice.filas[c] == primera + k: encontrados[c] = (primera + k, valores)
+                return encontrados
+            self._cargar_indice(ws, hoja)
+        raise RuntimeError(f"La hoja {hoja} cambia mientras se escribe; reintenta.")
+
+    def _anadir_filas(self, ws, hoja, filas):
+        """append_rows y, si las filas quedan justo tras la última conocida, al índice.
+
+        Si otro proceso añadió filas entretanto, el índice no avanza: la lectura de
+        la cola en el próximo _localizar recoge el hueco y estas filas, en orden.
+        """
+        respuesta = ws.append_rows(filas)
+        indice = self._indices.get(hoja)
+        if indice is None or not indice.cargado: return
+        primera = _fila_inicial(respuesta)
+        if primera == indice.ultima + 1: indice.anadir(primera, filas)
+        elif primera is None or primera <= indice.ultima: indice.cargado = False   # algo no cuadra: se recarga
+
+    def _en_libro(self, operacion):
+        return self.cliente.en_libro(operacion)
+
+    def _pedir_rangos(self, rangos):
+        """Filas de cada rango (de cualquier pestaña) con una sola llamada values:batchGet."""
+        if not rangos: return []
+        respuesta = self._en_libro(lambda libro: libro.values_batch_get(rangos))
+        return [r.get("values", []) for r in respuesta.get("valueRanges", [])]
+
+    def _registrar_descarga(self, hoja, valores):
+        """Hoja completa recién descargada: rellena huecos y recarga su índice de filas."""
+        valores = _rellenar(valores)
+        if hoja in self._locks:
+            with self._locks[hoja]:
+                self._indices[hoja].cargar(valores)
+        return valores
+
+    def _leer_con_respaldo(self, clave, hojas, leer):
+        """Agrupa lecturas idénticas simultáneas y, si Sheets falla tras los
+        reintentos del planificador, sirve la última copia buena de las hojas."""
+        try:
+            tablas = self._vuelos.hacer(clave, leer)
+        except Exception as e:
+            if any(h not in self._ultima_buena for h in hojas): raise
+            print(f"Sheets no responde al leer {', '.join(hojas)} ({e}); se sirve la última copia buena")
+            return {h: self._ultima_buena[h] for h in hojas}
+        self._ultima_buena.update(tablas)
+        return tablas
+
+    def leer_hojas(self, hojas):
+        hojas = tuple(hojas)
+        def leer():
+            bloques = self._pedir_rangos([_rango(h) for h in hojas])
+            return {h: _a_dataframe(self._registrar_descarga(h, v)) for h, v in zip(hojas, bloques)}
+        return self._leer_con_respaldo(("leer", hojas), hojas, leer)
+
+    def leer_hoja(self, hoja):
+        return self.leer_hojas([hoja])[hoja]
+
+    def _marcar_reescritas(self, hoja, filas):
+        with self._lock_sync:
+            self._reescritas.setdefault(hoja, set()).update(filas)
+
+    def _plan_incremental(self, hoja, epoca):
+        """Rangos a pedir para ponerse al día, o None si toca recarga completa.
+
+        Rangos: [desde la última fila conocida hasta el final, filas reescritas...].
+        La primera fila del primer rango hace de sonda; las siguientes son las nuevas.
+        """
+        snap = self._instantaneas.get(hoja)
+        if (snap is None or not snap.cabecera or snap.epoca != epoca
+                or time.monotonic() - snap.momento > INTERVALO_RECARGA_COMPLETA):
+            return None
+        col = _letra(len(snap.cabecera))
+        with self._lock_sync:
+            reescritas = sorted(f for f in self._reescritas.pop(hoja, ()) if 1 < f <= snap.filas)
+        return [f"A{snap.filas}:{col}"] + [f"A{f}:{col}{f}" for f in reescritas]
+
+    def _devolver_reescritas(self, planes):
+        """Vuelve a marcar las filas reescritas de planes que no llegaron a leerse."""
+        for hoja, plan in planes.items():
+            if plan: self._marcar_reescritas(hoja, [int(_RE_FILA.match(r).group(1)) for r in plan[1:]])
+
+    def _aplicar_incremental(self, hoja, rangos, leidos):
+        """Aplica la respuesta del plan. Devuelve False si la hoja cambió de estructura."""
+        snap = self._instantaneas[hoja]
+        n_clave = COLUMNAS_CLAVE.get(hoja, 1)
+        cola = leidos[0]
+        sonda = snap.ajustar(cola[0] if cola else [])
+        if sonda[:n_clave] != snap.ajustar(snap.ultima)[:n_clave]:
+            return False      # filas borradas o movidas: la sonda ya no coincide
+        if len(rangos) > 1: snap.df = snap.df.copy()     # los DataFrames ya entregados no cambian
+        for rango, valores in zip(rangos[1:], leidos[1:]):
+            fila = int(_RE_FILA.match(rango).group(1))
+            snap.df.iloc[fila - 2] = snap.ajustar(valores[0] if valores else [])
+            if fila == snap.filas: snap.ultima = list(snap.df.iloc[fila - 2])
+        nuevas = [snap.ajustar(v) for v in cola[1:]]
+        if nuevas:
+            snap.df = pd.concat([snap.df, pd.DataFrame(nuevas, columns=snap.cabecera)], ignore_index=True)
+            indice = self._indices.get(hoja)
+            if indice is not None and indice.cargado and indice.ultima == snap.filas:
+                with self._locks[hoja]:
+                    indice.anadir(snap.filas + 1, nuevas)
+            snap.filas += len(nuevas)
+            snap.ultima = nuevas[-1]
+        return True
+
+    def _pedir_planes(self, planes):
+        """{hoja: filas de cada rango del plan} (la hoja entera si el plan es None)."""
+        pedidos = [(h, a1) for h, plan in planes.items() for a1 in (plan or [None])]
+        leidos = {}
+        for (h, _), valores in zip(pedidos, self._pedir_rangos([_rango(h, a1) for h, a1 in pedidos])):
+            leidos.setdefault(h, []).append(valores)
+        return leidos
+
+    def sincronizar_hojas(self, hojas, epoca=None):
+        """Trae solo las filas nuevas y las reescritas por este proceso, de todas
+        las hojas en una sola llamada.
+
+        Una hoja se recarga entera si no hay copia previa, si cambia la época,
+        si la sonda de la última fila no coincide (un borrado) o cada
+        INTERVALO_RECARGA_COMPLETA segundos. No modifiques los DataFrames devueltos.
+        """
+        hojas = tuple(hojas)
+        def sincronizar():
+            with self._lock_instantaneas:
+                planes = previstos = {h: self._plan_incremental(h, epoca) for h in hojas}
+                try:
+                    try:
+                        leidos = self._pedir_planes(planes)
+                    except Exception as e:
+                        if not _fuera_de_rejilla(e): raise
+                        planes = dict.fromkeys(hojas)      # alguna hoja encogió: recarga completa
+                        leidos = self._pedir_planes(planes)
+                    recargar = []
+                    for h in hojas:
+                        if planes[h] is None:
+                            self._instantaneas[h] = _Instantanea(self._registrar_descarga(h, leidos[h][0]), epoca)
+                        elif not self._aplicar_incremental(h, planes[h], leidos[h]):
+                            recargar.append(h)
+                    # Solo hace falta una segunda llamada si falló alguna sonda
+                    for h, valores in zip(recargar, self._pedir_rangos([_rango(h) for h in recargar])):
+                        self._instantaneas[h] = _Instantanea(self._registrar_descarga(h, valores), epoca)
+                except Exception:
+                    self._devolver_reescritas(previstos)     # se vuelven a pedir en la próxima
+                    raise
+                return {h: self._instantaneas[h].df for h in hojas}
+        return self._leer_con_respaldo(("sincronizar", hojas, epoca), hojas, sincronizar)
+
+    def sincronizar_hoja(self, hoja, epoca=None):
+        return self.sincronizar_hojas([hoja], epoca)[hoja]
+
+    def ligas_usuario(self, usuario):
+        def leer(ws):
+            with self._locks[HOJA_USUARIOS]:
+                encontrado = self._localizar(ws, HOJA_USUARIOS, [(usuario,)], ultima_col="D").get((usuario,))
+            if encontrado is None: return None
+            valores = encontrado[1]
+            return valores[3] if len(valores) > 3 else ""
+        return self._en_hoja(HOJA_USUARIOS, leer)
+
+    def anadir_usuario(self, usuario, password, rol, ligas):
+        def anadir(ws):
+            with self._locks[HOJA_USUARIOS]:
+                self._anadir_filas(ws, HOJA_USUARIOS, [[usuario, password, rol, ligas]])
+        self._en_hoja(HOJA_USUARIOS, anadir)
+
+    def _actualizar_usuarios(self, columna, valores):
+        """Escribe {usuario: valor} en una columna con un solo batch_update.
+        Lanza KeyError si alguno no existe (sin escribir nada)."""
+        def actualizar(ws):
+            with self._locks[HOJA_USUARIOS]:
+                posiciones = self._localizar(ws, HOJA_USUARIOS, [(u,) for u in valores])
+                filas = {u: posiciones[(u,)][0] for u in valores}
+                ws.batch_update([{"range": f"{columna}{fila}", "values": [[valores[u]]]} for u, fila in filas.items()])
+                self._marcar_reescritas(HOJA_USUARIOS, filas.values())
+        if valores: self._en_hoja(HOJA_USUARIOS, actualizar)
+
+    def actualizar_roles(self, roles):
+        self._actualizar_usuarios("C", roles)
+
+    def actualizar_ligas(self, usuario, ligas):
+        self._actualizar_usuarios("D", {usuario: ligas})
+
+    def borrar_usuarios(self, usuarios):
+        def borrar(ws):
+            with self._locks[HOJA_USUARIOS]:
+                posiciones = self._localizar(ws, HOJA_USUARIOS, [(u,) for u in usuarios])
+                filas = sorted((f for f, _ in posiciones.values()), reverse=True)   # de abajo arriba
+                if not filas: return
+                ws.spreadsheet.batch_update({"requests": [
+                    {"deleteDimension": {"range": {"sheetId": ws.id, "dimension": "ROWS",
+                                                   "startIndex": f - 1, "endIndex": f}}}
+                    for f in filas]})
+                for f in filas: self._indices[HOJA_USUARIOS].borrar(f)
+                self._instantaneas.pop(HOJA_USUARIOS, None)
+        if usuarios: self._en_hoja(HOJA_USUARIOS, borrar)
+
+    def guardar_apuestas_lote(self, hoja, filas):
+        def upsert(ws):
+            with self._locks[hoja]:
+                posiciones = self._localizar(ws, hoja, [(str(f[0]), str(f[1])) for f in filas])
+                cambios, nuevas = [], []
+                for usuario, id_evento, fecha, datos in filas:
+                    encontrado = posiciones.get((str(usuario), str(id_evento)))
+                    if encontrado:
+                        fila = encontrado[0]
+                        cambios.append({"range": f"C{fila}:D{fila}", "values": [[fecha, datos]]})
+                    else: nuevas.append([usuario, id_evento, fecha, datos])
+                if cambios:
+                    ws.batch_update(cambios)
+                    self._marcar_reescritas(hoja, [posiciones[(str(f[0]), str(f[1]))][0] for f in filas
+                                                   if (str(f[0]), str(f[1])) in posiciones])
+                if nuevas: self._anadir_filas(ws, hoja, nuevas)
+        self._en_hoja(hoja, upsert)
+
+    def guardar_resultados_lote(self, filas):
+        """Los eventos que ya tienen fila se reescriben con un batch_update; los
+        nuevos se añaden con un append_rows."""
+        filas = _por_evento(filas)
+        ultima_col = _letra(len(COLUMNAS[HOJA_RESULTADOS]))
+        def upsert(ws):
+            with self._locks[HOJA_RESULTADOS]:
+                posiciones = self._localizar(ws, HOJA_RESULTADOS, [(f[0],) for f in filas])
+                cambios, nuevas = [], []
+                for fila in filas:
+                    encontrado = posiciones.get((fila[0],))
+                    if encontrado:
+                        n = encontrado[0]
+                        cambios.append({"range": f"A{n}:{ultima_col}{n}", "values": [fila]})
+                    else: nuevas.append(fila)
+                if cambios:
+                    ws.batch_update(cambios)
+                    self._marcar_reescritas(HOJA_RESULTADOS, [f for f, _ in posiciones.values()])
+                if nuevas: self._anadir_filas(ws, HOJA_RESULTADOS, nuevas)
+        if filas: self._en_hoja(HOJA_RESULTADOS, upsert)
+
+
+# ==========================================
+#              MOTOR SQLITE
+# ==========================================
+_ESQUEMA = f"""
+CREATE TABLE IF NOT EXISTS {HOJA_USUARIOS} (
+    usuario TEXT PRIMARY KEY, password TEXT, rol TEXT, liga_privada TEXT DEFAULT ''
+);
+CREATE TABLE IF NOT EXISTS {HOJA_CALENDARIO} (
+    id_evento TEXT PRIMARY KEY, nombre_mostrar TEXT, fecha_limite TEXT
+);
+CREATE TABLE IF NOT EXISTS {HOJA_CARRERA} (
+    usuario TEXT, carrera TEXT, fecha TEXT, datos_encriptados TEXT,
+    PRIMARY KEY (usuario, carrera)
+);
+CREATE INDEX IF NOT EXISTS idx_carrera_usuario ON {HOJA_CARRERA} (usuario);
+CREATE INDEX IF NOT EXISTS idx_carrera_evento ON {HOJA_CARRERA} (carrera);
+CREATE TABLE IF NOT EXISTS {HOJA_MUNDIAL} (
+    usuario TEXT, tipo TEXT, fecha TEXT, datos_encriptados TEXT,
+    PRIMARY KEY (usuario, tipo)
+);
+CREATE INDEX IF NOT EXISTS idx_mundial_usuario ON {HOJA_MUNDIAL} (usuario);
+CREATE INDEX IF NOT EXISTS idx_mundial_evento ON {HOJA_MUNDIAL} (tipo);
+CREATE TABLE IF NOT EXISTS {HOJA_RESULTADOS} (
+    {", ".join(f"{c} TEXT DEFAULT ''" for c in COLUMNAS[HOJA_RESULTADOS])}
+);
+CREATE INDEX IF NOT EXISTS idx_resultados_evento ON {HOJA_RESULTADOS} (carrera);
+"""
+
+
+class AlmacenSQLite(Almacen):
+    """Motor local. Una conexión compartida entre hilos, serializada con un lock."""
+
+    def __init__(self, ruta=":memory:"):
+        self.ruta = ruta
+        self._lock = threading.Lock()
+        self._con = sqlite3.connect(ruta, check_same_thread=False)
+        if ruta != ":memory:":
+            self._con.execute("PRAGMA journal_mode=WAL")
+        self._con.executescript(_ESQUEMA)
+
+    def _consulta(self, sql, params=()):
+        with self._lock:
+            return self._con.execute(sql, params).fetchall()
+
+    def _ejecutar(self, sql, params=()):
+        with self._lock, self._con:
+            return self._con.execute(sql, params)
+
+    def _ejecutar_varios(self, sql, filas):
+        with self._lock, self._con:
+            self._con.executemany(sql, filas)
+
+    def importar(self, hoja, filas):
+        """Carga masiva de filas (listas o dicts) en una hoja, p.ej. el calendario."""
+        columnas = COLUMNAS[hoja]
+        valores = [[f.get(c, "") for c in columnas] if isinstance(f, dict) else list(f) for f in filas]
+        marcas = ", ".join("?" * len(columnas))
+        self._ejecutar_varios(
+            f"INSERT OR REPLACE INTO {hoja} ({', '.join(columnas)}) VALUES ({marcas})", valores)
+
+    def leer_hoja(self, hoja):
+        columnas = COLUMNAS[hoja]
+        filas = self._consulta(f"SELECT {', '.join(columnas)} FROM {hoja} ORDER BY rowid")
+        return pd.DataFrame(filas, columns=columnas)
+
+    def ligas_usuario(self, usuario):
+        filas = self._consulta(f"SELECT liga_privada FROM {HOJA_USUARIOS} WHERE usuario = ?", (usuario,))
+        return (filas[0][0] or "") if filas else None
+
+    def anadir_usuario(self, usuario, password, rol, ligas):
+        self._ejecutar(f"INSERT INTO {HOJA_USUARIOS} VALUES (?, ?, ?, ?)", (usuario, password, rol, ligas))
+
+    def actualizar_roles(self, roles):
+        self._ejecutar_varios(f"UPDATE {HOJA_USUARIOS} SET rol = ? WHERE usuario = ?",
+                              [(rol, usuario) for usuario, rol in roles.items()])
+
+    def actualizar_ligas(self, usuario, ligas):
+        self._ejecutar(f"UPDATE {HOJA_USUARIOS} SET liga_privada = ? WHERE usuario = ?", (ligas, usuario))
+
+    def borrar_usuarios(self, usuarios):
+        self._ejecutar_varios(f"DELETE FROM {HOJA_USUARIOS} WHERE usuario = ?", [(u,) for u in usuarios])
+
+    def guardar_apuestas_lote(self, hoja, filas):
+        col = COLUMNA_EVENTO[hoja]
+        self._ejecutar_varios(
+            f"INSERT INTO {hoja} (usuario, {col}, fecha, datos_encriptados) VALUES (?, ?, ?, ?) "
+            f"ON CONFLICT (usuario, {col}) DO UPDATE SET "
+            f"fecha = excluded.fecha, datos_encriptados = excluded.datos_encriptados",
+            [tuple(f) for f in filas])
+
+    def guardar_resultados_lote(self, filas):
+        columnas = COLUMNAS[HOJA_RESULTADOS]
+        asignaciones = ", ".join(f"{c} = ?" for c in columnas[1:])
+        with self._lock, self._con:
+            for fila in _por_evento(filas):
+                # Sustituye la última fila del evento en su sitio (no cambia el orden de las rondas)
+                cursor = self._con.execute(
+                    f"UPDATE {HOJA_RESULTADOS} SET {asignaciones} WHERE rowid = "
+                    f"(SELECT MAX(rowid) FROM {HOJA_RESULTADOS} WHERE carrera = ?)", fila[1:] + [fila[0]])
+                if not cursor.rowcount:
+                    self._con.execute(
+                        f"INSERT INTO {HOJA_RESULTADOS} VALUES ({', '.join('?' * len(columnas))})", fila)
+
+
+def crear_almacen(config, creds_dict=None):
+    """Construye el motor según la configuración ({'motor': 'sheets'|'sqlite', 'ruta': ...,
+    'cuota_por_minuto': ...})."""
+    motor = config.get("motor", "sheets")
+    if motor == "sqlite":
+        return AlmacenSQLite(config.get("ruta", "porra.db"))
+    if motor == "sheets":
+        return AlmacenSheets(creds_dict, config.get("libro", NOMBRE_LIBRO),
+                             int(config.get("cuota_por_minuto", 60)))
+    raise ValueError(f"Motor de almacenamiento desconocido: {motor}")
@@ -1,22 +1,26 @@
 import streamlit as st
 import pandas as pd
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
-from cryptography.fernet import Fernet
+import altair as alt
 from datetime import datetime
-import pytz
 import time
+from almacenamiento import (crear_almacen, hoja_apuestas, ajustar_resultado, COLUMNAS, HOJA_USUARIOS,
+                            HOJA_CALENDARIO, HOJA_CARRERA, HOJA_MUNDIAL, HOJA_RESULTADOS, ERRORES_ALMACEN)
+from apuestas import PILOTOS_2026
+from puntuacion import Clasificacion, MotorClasificacion
+from cifrado import Descifrador
+from cola_escritura import ColaEscrituras
+from calendario import compilar_calendario
+from directorio import DirectorioUsuarios, parsear_ligas
+from indice_apuestas import IndiceApuestas
+from instantanea import CacheDisco
+from metricas import METRICAS, medir_cache, contar, observar, tramo
+
+# Eventos por página en el resumen de la pestaña Clasificación
+EVENTOS_POR_PAGINA = 8
 
 # --- CONFIGURACIÓN DE PÁGINA ---
 st.set_page_config(page_title="F1 2026 Manager", page_icon="🏎️", layout="wide")
-
-# Lista de Pilotos Oficial
-PILOTOS_2026 = [
-    "Verstappen", "Hadjar", "Leclerc", "Hamilton", "Norris", "Piastri", 
-    "Alonso", "Stroll", "Sainz", "Albon", "Russell", "Antonelli", 
-    "Bearman", "Ocon", "Gasly", "Colapinto", "Lawson", "Lindblad", 
-    "Checo", "Bottas", "Hulkenberg", "Bortoleto"
-]
+_inicio_rerun = time.perf_counter()
 
 # --- GESTIÓN DE SESIÓN ---
 if 'logged_in' not in st.session_state:
@@ -29,86 +33,157 @@ if 'mis_ligas' not in st.session_state:
     st.session_state.mis_ligas = []
 if 'mi_liga' not in st.session_state:
     st.session_state.mi_liga = ""
+if 'mis_apuestas' not in st.session_state:
+    st.session_state.mis_apuestas = {}   # id_evento -> apuesta descifrada del usuario
 
 # --- CONEXIONES ---
-def conectar_sheet():
-    scope = ['https://spreadsheets.google.com/feeds', 'https://www.googleapis.com/auth/drive']
-    creds_dict = st.secrets["gcp_service_account"]
-    creds = ServiceAccountCredentials.from_json_keyfile_dict(creds_dict, scope)
-    client = gspread.authorize(creds)
-    return client.open("Base de Datos F1 2026")
+@st.cache_resource
+def obtener_almacen():
+    """Motor de datos compartido por todas las sesiones ([almacen] motor = "sheets" | "sqlite")"""
+    config = dict(st.secrets.get("almacen", {}))
+    creds = st.secrets["gcp_service_account"] if config.get("motor", "sheets") == "sheets" else None
+    return crear_almacen(config, creds)
+
+@st.cache_resource
+def obtener_cola():
+    """Diario local de apuestas pendientes + volcador a la base de datos en segundo plano"""
+    ruta = st.secrets.get("almacen", {}).get("cola", "cola_apuestas.db")
+    return ColaEscrituras(obtener_almacen(), ruta, al_volcar=limpiar_resultados).iniciar()
 
 def get_encryption_key():
     return st.secrets["encryption_key"]["value"].encode()
 
-def encriptar(texto):
-    f = Fernet(get_encryption_key())
-    return f.encrypt(texto.encode()).decode()
+@st.cache_resource
+def obtener_descifrador():
+    """Fernet único con caché LRU de apuestas descifradas"""
+    return Descifrador(get_encryption_key())
+
+def encriptar(pilotos):
+    """Lista de pilotos -> token en formato compacto (ver apuestas.py)"""
+    return obtener_descifrador().encriptar(pilotos)
 
 def desencriptar(texto_encriptado):
+    """Token -> lista de pilotos (lee también las apuestas antiguas en texto)"""
     try:
-        f = Fernet(get_encryption_key())
-        return f.decrypt(texto_encriptado.encode()).decode()
+        return obtener_descifrador().desencriptar(texto_encriptado)
     except:
-        return "Error/Corrupto"
+        return ["Error/Corrupto"]
+
+@st.cache_resource
+def obtener_motor_clasificacion():
+    """Puntos materializados por evento, compartidos por todas las sesiones"""
+    return MotorClasificacion()
+
+@st.cache_resource
+def obtener_cache_disco():
+    """Instantáneas en disco compartidas por todos los procesos del servidor"""
+    return CacheDisco(st.secrets.get("almacen", {}).get("instantaneas", ".cache_porra"))
+
+@st.cache_resource
+def obtener_exportador_metricas():
+    """Si [metricas] fichero está configurado, vuelca las métricas ahí cada pocos segundos"""
+    config = st.secrets.get("metricas", {})
+    if not config.get("fichero"): return None
+    return METRICAS.exportar_periodicamente(config["fichero"], float(config.get("intervalo", 15)))
+
+def limpiar_maestros():
+    obtener_datos_maestros.clear()
+    obtener_indices_maestros.clear()
+    obtener_cache_disco().invalidar("maestros")
+
+def limpiar_resultados():
+    obtener_datos_resultados.clear()
+    obtener_indice_apuestas.clear()
+    obtener_clasificacion.clear()
+    obtener_cache_disco().invalidar("resultados")
 
 # --- FUNCIONES DE LECTURA OPTIMIZADAS (CACHÉ) ---
+@medir_cache("maestros")
 @st.cache_data(ttl=300)
 def obtener_datos_maestros():
-    """Descarga Calendario y Usuarios (5 min caché)"""
-    try:
-        sh = conectar_sheet()
-        ws_cal = sh.worksheet("calendario")
-        df_cal = pd.DataFrame(ws_cal.get_all_records())
-        
-        madrid_tz = pytz.timezone('Europe/Madrid')
-        def parse_date(date_str):
-            try:
-                dt = datetime.strptime(str(date_str), "%d/%m/%Y %H:%M:%S")
-                return madrid_tz.localize(dt)
-            except:
-                try:
-                    dt = datetime.strptime(str(date_str), "%d/%m/%Y %H:%M")
-                    return madrid_tz.localize(dt)
-                except: return None
-        df_cal['fecha_dt'] = df_cal['fecha_limite'].apply(parse_date)
-
-        ws_users = sh.worksheet("usuarios")
-        df_users = pd.DataFrame(ws_users.get_all_records())
-        if not df_users.empty:
-            df_users['usuario'] = df_users['usuario'].astype(str)
-            df_users['password'] = df_users['password'].astype(str)
-            if 'liga_privada' not in df_users.columns: df_users['liga_privada'] = ""
-        
-        return df_cal, df_users
-    except: return pd.DataFrame(), pd.DataFrame()
-
-@st.cache_data(ttl=60) 
-def obtener_datos_resultados():
-    """Descarga Resultados y Apuestas (1 min caché)"""
-    try:
-        sh = conectar_sheet()
-        df_res = pd.DataFrame(sh.worksheet("resultados_oficiales").get_all_records())
-        df_bets_c = pd.DataFrame(sh.worksheet("pronosticos_carrera").get_all_records())
-        df_bets_m = pd.DataFrame(sh.worksheet("pronosticos_mundial").get_all_records())
-        return df_res, df_bets_c, df_bets_m
-    except: return pd.DataFrame(), pd.DataFrame(), pd.DataFrame()
+    """Calendario y Usuarios (5 min caché). Un proceso recién arrancado los toma
+    de la instantánea en disco. Si la fuente falla sin copia a la que volver, la
+    excepción sube y no se cachea: el siguiente rerun lo vuelve a intentar."""
+    contar("cache_fallos", cache="maestros")
+    almacen = obtener_almacen()
+    tablas = obtener_cache_disco().obtener(
+        "maestros", lambda: almacen.leer_hojas([HOJA_CALENDARIO, HOJA_USUARIOS]), max_edad=300)
+    df_cal = tablas[HOJA_CALENDARIO]
+    df_users = tablas[HOJA_USUARIOS]
+    if not df_users.empty:
+        df_users['usuario'] = df_users['usuario'].astype(str)
+        df_users['password'] = df_users['password'].astype(str)
+        if 'liga_privada' not in df_users.columns: df_users['liga_privada'] = ""
+    return df_cal, df_users
+
+@medir_cache("indices_maestros")
+@st.cache_resource(ttl=300)
+def obtener_indices_maestros():
+    """Calendario compilado y directorio de usuarios/ligas, compartidos sin copiar:
+    un rerun no los deserializa"""
+    contar("cache_fallos", cache="indices_maestros")
+    df_cal, df_users = obtener_datos_maestros()
+    return compilar_calendario(df_cal), DirectorioUsuarios(df_users)
+
+@medir_cache("resultados")
+@st.cache_data(ttl=60, max_entries=2)
+def obtener_datos_resultados(epoca=0):
+    """Resultados y Apuestas. La caché va por época del calendario: caduca justo en
+    cada cierre. El ttl solo relee la instantánea en disco (refrescada en segundo
+    plano); entre cierres solo se descargan las filas nuevas. Los fallos suben sin
+    cachearse, como en obtener_datos_maestros."""
+    contar("cache_fallos", cache="resultados")
+    almacen = obtener_almacen()
+    hojas = (HOJA_RESULTADOS, HOJA_CARRERA, HOJA_MUNDIAL)
+    tablas = obtener_cache_disco().obtener(
+        "resultados", lambda: almacen.sincronizar_hojas(hojas, epoca),
+        max_edad=60, epoca=epoca)
+    df_res, df_bets_c, df_bets_m = (tablas[h] for h in hojas)
+    return df_res, df_bets_c, df_bets_m
+
+@medir_cache("indice_apuestas")
+@st.cache_resource(ttl=60, max_entries=2)
+def obtener_indice_apuestas(epoca=0):
+    """Último token de cada (usuario, evento) de la época, compartido sin copiar"""
+    contar("cache_fallos", cache="indice_apuestas")
+    _, df_bets_c, df_bets_m = obtener_datos_resultados(epoca)
+    return IndiceApuestas(df_bets_c, df_bets_m)
+
+def mi_apuesta(usuario, id_evento, epoca):
+    """Apuesta vigente del usuario, descifrada una vez por sesión: los reruns del
+    formulario no filtran hojas ni descifran. guardar_apuesta la invalida."""
+    if id_evento not in st.session_state.mis_apuestas:
+        hoja = hoja_apuestas("mundial" if "mundial" in id_evento else "carrera")
+        # Una apuesta aún en cola manda sobre la de la hoja
+        datos = (obtener_cola().pendiente(hoja, usuario, id_evento)
+                 or obtener_indice_apuestas(epoca).ultima(hoja, usuario, id_evento))
+        if not datos: return []
+        st.session_state.mis_apuestas[id_evento] = desencriptar(datos)
+    return st.session_state.mis_apuestas[id_evento]
+
+@medir_cache("clasificacion")
+@st.cache_resource(ttl=60, max_entries=2)
+def obtener_clasificacion(epoca=0):
+    """Clasificación agregada de la época, compartida sin copiar por todas las
+    sesiones: un rerun de la pestaña no vuelve a recorrer la temporada."""
+    contar("cache_fallos", cache="clasificacion")
+    df_res, df_bets_c, df_bets_m = obtener_datos_resultados(epoca)
+    calendario, _ = obtener_indices_maestros()
+    return Clasificacion(*obtener_motor_clasificacion().actualizar(
+        df_res, df_bets_c, df_bets_m,
+        lambda ev: verificar_estado_evento(ev, calendario) == "CERRADO", obtener_descifrador()))
 
 # --- FUNCIONES DE ESCRITURA (SIN CACHÉ) ---
 
 def registrar_usuario_nuevo(user, password, liga_input):
     nombre_liga = liga_input.strip().upper() if liga_input else ""
     try:
-        _, df_users = obtener_datos_maestros() 
-        if not df_users.empty:
-            usuarios_existentes = df_users['usuario'].astype(str).tolist()
-            if user in usuarios_existentes:
-                return False, "⚠️ Ese nombre de usuario ya existe."
+        _, directorio = obtener_indices_maestros()
+        if directorio.existe(user):
+            return False, "⚠️ Ese nombre de usuario ya existe."
         
-        sh = conectar_sheet()
-        ws = sh.worksheet("usuarios")
-        ws.append_row([user, password, "pendiente", nombre_liga])
-        obtener_datos_maestros.clear()
+        obtener_almacen().anadir_usuario(user, password, "pendiente", nombre_liga)
+        limpiar_maestros()
         return True, "✅ Solicitud enviada. Espera aprobación del Admin."
     except Exception as e: return False, f"Error: {e}"
 
@@ -116,129 +191,107 @@ def unirse_a_nueva_liga(usuario, nueva_liga):
     nombre_clean = nueva_liga.strip().upper()
     if not nombre_clean: return False, "Nombre vacío"
     try:
-        sh = conectar_sheet()
-        ws = sh.worksheet("usuarios")
-        cell = ws.find(usuario)
-        ligas_actuales_str = ws.cell(cell.row, 4).value
-        if not ligas_actuales_str: ligas_actuales_str = ""
-        lista_actual = [l.strip().upper() for l in ligas_actuales_str.split(",") if l.strip()]
+        almacen = obtener_almacen()
+        ligas_actuales_str = almacen.ligas_usuario(usuario)
+        if ligas_actuales_str is None: return False, "Usuario no encontrado."
+        lista_actual = parsear_ligas(ligas_actuales_str)
         if nombre_clean in lista_actual: return False, "Ya estás en esa liga."
         lista_actual.append(nombre_clean)
-        ws.update_cell(cell.row, 4, ", ".join(lista_actual))
-        obtener_datos_maestros.clear() 
+        almacen.actualizar_ligas(usuario, ", ".join(lista_actual))
+        limpiar_maestros() 
         return True, "¡Unido con éxito!"
     except Exception as e: return False, f"Error: {e}"
 
-def aprobar_usuario(usuario_a_aprobar):
+def aprobar_usuarios(usuarios):
+    """Aprueba todos los usuarios de la lista con una sola escritura"""
     try:
-        sh = conectar_sheet()
-        ws = sh.worksheet("usuarios")
-        cell = ws.find(usuario_a_aprobar)
-        ws.update_cell(cell.row, 3, "user")
-        obtener_datos_maestros.clear()
+        obtener_almacen().actualizar_roles({u: "user" for u in usuarios})
+        limpiar_maestros()
         return True
     except: return False
 
-def borrar_usuario(usuario_a_borrar):
+def borrar_usuarios(usuarios):
+    """Rechaza (borra) todos los usuarios de la lista con una sola escritura"""
     try:
-        sh = conectar_sheet()
-        ws = sh.worksheet("usuarios")
-        cell = ws.find(usuario_a_borrar)
-        ws.delete_rows(cell.row)
-        obtener_datos_maestros.clear()
+        obtener_almacen().borrar_usuarios(usuarios)
+        limpiar_maestros()
         return True
     except: return False
 
 def guardar_apuesta(usuario, id_evento, cadena_encriptada, tipo_apuesta):
     try:
-        sh = conectar_sheet()
-        if tipo_apuesta == "mundial":
-            ws = sh.worksheet("pronosticos_mundial")
-        else:
-            ws = sh.worksheet("pronosticos_carrera")
-            
-        data = ws.get_all_values()
-        fila_encontrada = -1
-        
-        for i in range(1, len(data)):
-            if data[i][0] == usuario and data[i][1] == id_evento:
-                fila_encontrada = i + 1 
-                break
-        
-        if fila_encontrada > 0:
-            ws.update_cell(fila_encontrada, 3, str(datetime.now()))
-            ws.update_cell(fila_encontrada, 4, cadena_encriptada)
-        else:
-            ws.append_row([usuario, id_evento, str(datetime.now()), cadena_encriptada])
-            
-        obtener_datos_resultados.clear()
+        # La hora se fija al encolar: cuenta aunque el volcado llegue tras el cierre
+        obtener_cola().encolar(hoja_apuestas(tipo_apuesta), usuario, id_evento,
+                               str(datetime.now()), cadena_encriptada)
+        st.session_state.mis_apuestas.pop(id_evento, None)
         return True
     except Exception as e:
         print(f"Error guardando: {e}")
         return False
 
 def guardar_resultado_oficial(fila_datos):
+    """Inserta o corrige el resultado del evento (fila_datos[0]), sin duplicar filas"""
+    try:
+        obtener_almacen().guardar_resultado(fila_datos)
+        limpiar_resultados()
+        return True
+    except: return False
+
+def importar_resultados_oficiales(filas):
+    """Upsert de varios resultados en una sola escritura (más un alta para los nuevos)"""
     try:
-        sh = conectar_sheet()
-        ws = sh.worksheet("resultados_oficiales")
-        ws.append_row(fila_datos)
-        obtener_datos_resultados.clear()
+        obtener_almacen().guardar_resultados_lote(filas)
+        limpiar_resultados()
         return True
     except: return False
 
+def leer_csv_resultados(fichero, eventos):
+    """CSV con columnas carrera, p1..p22 [, oficial] -> (filas listas para guardar, descartadas, avisos).
+
+    Se descartan las filas que borrarían un resultado bueno al guardarse: sin
+    carrera, sin p1 o con un evento que no está en el calendario."""
+    try: df = pd.read_csv(fichero, dtype=str, keep_default_na=False, encoding="utf-8-sig")   # BOM de Excel
+    except (pd.errors.ParserError, pd.errors.EmptyDataError, UnicodeDecodeError) as e:
+        return [], [], [f"No se pudo leer el CSV: {e}"]
+    if 'carrera' not in df.columns: return [], [], ["Falta la columna 'carrera'."]
+    columnas = COLUMNAS[HOJA_RESULTADOS]
+    df = df.reindex(columns=columnas, fill_value="")
+    df['carrera'] = df['carrera'].str.strip()
+    df['oficial'] = df['oficial'].replace("", "TRUE")
+    filas, descartadas, avisos = [], [], []
+    conocidos = set(PILOTOS_2026)
+    for n, fila in enumerate(df.values.tolist(), start=2):      # nº de línea en el CSV
+        ev, pilotos = fila[0], fila[1:-1]
+        if not ev: descartadas.append(f"Línea {n}: sin carrera")
+        elif ev not in eventos: descartadas.append(f"Línea {n}: evento desconocido {ev}")
+        elif not pilotos[0]: descartadas.append(f"Línea {n} ({ev}): sin p1")
+        else:
+            raros = [p for p in pilotos if p and p not in conocidos]
+            if raros: avisos.append(f"{ev}: pilotos desconocidos {', '.join(raros)}")
+            filas.append(ajustar_resultado(fila))
+    return filas, descartadas, avisos
+
 # --- LÓGICA DE NEGOCIO ---
 
 def verificar_login(user, password):
-    _, df_users = obtener_datos_maestros()
-    try:
-        usuario_encontrado = df_users[df_users['usuario'] == user]
-        if not usuario_encontrado.empty:
-            password_real = usuario_encontrado.iloc[0]['password']
-            if str(password) == password_real:
-                rol = usuario_encontrado.iloc[0]['rol']
-                if rol == "pendiente": return False, "pendiente", []
-                ligas_str = str(usuario_encontrado.iloc[0]['liga_privada'])
-                lista_ligas = [l.strip().upper() for l in ligas_str.split(",") if l.strip()]
-                return True, rol, lista_ligas
-        return False, None, []
+    try: _, directorio = obtener_indices_maestros()
+    except ERRORES_ALMACEN: return False, None, []
+    try: return directorio.login(user, password)
     except: return False, None, []
 
-def verificar_estado_evento(id_evento, df_calendario):
-    idx_evento = df_calendario.index[df_calendario['id_evento'] == id_evento].tolist()
-    if not idx_evento: return 'ERROR'
-    idx = idx_evento[0]
-    evento_actual = df_calendario.iloc[idx]
-    fecha_limite = evento_actual['fecha_dt']
-    ahora = datetime.now(pytz.timezone('Europe/Madrid'))
-    if ahora > fecha_limite: return 'CERRADO'
-    if idx == 0: return 'ABIERTO'
-    if id_evento == 'gp_01': evento_previo = df_calendario.iloc[0]
-    else: evento_previo = df_calendario.iloc[idx - 1]
-    fecha_limite_previo = evento_previo['fecha_dt']
-    if ahora < fecha_limite_previo: return 'PENDIENTE'
-    return 'ABIERTO'
-
-def calcular_puntos_carrera(prediccion_lista, resultado_lista):
-    puntos = 0
-    for i, piloto in enumerate(prediccion_lista):
-        if i >= 10: break
-        try: pos_real = resultado_lista.index(piloto)
-        except: pos_real = -1
-        if pos_real == i: puntos += 4
-        elif i < 3 and pos_real < 3 and pos_real != -1: puntos += 2
-        elif pos_real < 10 and pos_real != -1: puntos += 1
-    return puntos
-
-def calcular_puntos_mundial(prediccion_lista, resultado_lista):
-    puntos = 0
-    for i, piloto in enumerate(prediccion_lista):
-        try:
-            pos_real = resultado_lista.index(piloto)
-            diferencia = abs(i - pos_real)
-            if diferencia == 0: puntos += 30
-            elif diferencia == 1: puntos += 10
-        except: pass
-    return puntos
+def verificar_estado_evento(id_evento, calendario):
+    """ABIERTO / PENDIENTE / CERRADO / ERROR con el calendario compilado (bisect)"""
+    return calendario.estado(id_evento)
+
+def grafico_evolucion(tabla, eje, invertir=False):
+    """Líneas por jugador de una tabla usuario x ronda, con las rondas en su orden"""
+    datos = tabla.T.reset_index(names="Ronda").melt("Ronda", var_name="Jugador", value_name=eje)
+    return alt.Chart(datos).mark_line(point=True).encode(
+        x=alt.X("Ronda:N", sort=tabla.columns.tolist()),
+        y=alt.Y(f"{eje}:Q", scale=alt.Scale(reverse=invertir, zero=not invertir)),
+        color="Jugador:N", tooltip=["Jugador", "Ronda", eje])
+
+obtener_exportador_metricas()
 
 # ==========================================
 #              INTERFAZ DE ACCESO
@@ -258,6 +311,7 @@ if not st.session_state.logged_in:
                 st.session_state.usuario_actual = l_user
                 st.session_state.rol_usuario = rol
                 st.session_state.mis_ligas = ligas
+                st.session_state.mis_apuestas = {}
                 st.success(f"Bienvenido {l_user}")
                 time.sleep(0.5)
                 st.rerun()
@@ -275,17 +329,9 @@ if not st.session_state.logged_in:
         
         if r_liga:
             nombre_limpio = r_liga.strip().upper()
-            df_cal, df_users = obtener_datos_maestros()
-            todas_ligas = []
-            if not df_users.empty and 'liga_privada' in df_users.columns:
-                 for item in df_users['liga_privada'].astype(str):
-                    partes = item.split(",")
-                    for p in partes:
-                        limpia = p.strip().upper()
-                        if limpia: todas_ligas.append(limpia)
-            todas_ligas = list(set(todas_ligas))
-
-            if nombre_limpio in todas_ligas: st.info(f"👥 Te unirás a: **{nombre_limpio}**")
+            try: _, directorio = obtener_indices_maestros()
+            except ERRORES_ALMACEN: directorio = DirectorioUsuarios(pd.DataFrame())
+            if nombre_limpio in directorio.ligas: st.info(f"👥 Te unirás a: **{nombre_limpio}**")
             else: st.success(f"✨ Fundarás: **{nombre_limpio}**")
 
         if st.button("Solicitar Registro"):
@@ -299,7 +345,12 @@ if not st.session_state.logged_in:
 #              APP PRINCIPAL
 # ==========================================
 else:
-    df_cal, df_users = obtener_datos_maestros()
+    try:
+        df_cal, df_users = obtener_datos_maestros()
+        calendario, directorio = obtener_indices_maestros()
+    except ERRORES_ALMACEN as e:
+        print(f"No se pudieron cargar calendario y usuarios: {e}")
+        df_cal = pd.DataFrame()
     if df_cal.empty:
         st.error("Error crítico: No se pudo conectar con la base de datos. Recarga la página.")
         st.stop()
@@ -330,6 +381,7 @@ else:
         if st.button("Cerrar Sesión"):
             st.session_state.logged_in = False
             st.session_state.usuario_actual = None
+            st.session_state.mis_apuestas = {}
             st.rerun()
 
     st.title("🏆 Porra F1 2026")
@@ -338,40 +390,27 @@ else:
     if st.session_state.rol_usuario == "admin":
         tabs_list.append("⚙️ Resultados")
         tabs_list.append("👥 Usuarios")
+        tabs_list.append("📈 Rendimiento")
     
     tabs = st.tabs(tabs_list)
 
     # --- TAB 1: HACER PORRA ---
-    with tabs[0]:
+    with tabs[0], tramo("pestana", pestana="hacer_porra"):
         st.subheader("Tu predicción")
         lista_eventos = df_cal['nombre_mostrar'].tolist()
-        idx_defecto = 0
-        for i, row in df_cal.iterrows():
-            if verificar_estado_evento(row['id_evento'], df_cal) == "ABIERTO":
-                idx_defecto = i; break
+        idx_defecto = calendario.primer_abierto()
         
         evento_seleccionado_nombre = st.selectbox("Gran Premio:", lista_eventos, index=idx_defecto)
         row_evento = df_cal[df_cal['nombre_mostrar'] == evento_seleccionado_nombre].iloc[0]
         id_evento = row_evento['id_evento']
-        estado = verificar_estado_evento(id_evento, df_cal)
+        estado = verificar_estado_evento(id_evento, calendario)
         
         # --- CARGAR APUESTA ANTERIOR (Solo para visualizar) ---
-        _, df_bets_c, df_bets_m = obtener_datos_resultados()
-        mi_apuesta_actual = []
+        try: mi_apuesta_actual = mi_apuesta(st.session_state.usuario_actual, id_evento, calendario.epoca())
+        except ERRORES_ALMACEN:
+            mi_apuesta_actual = []
+            st.warning("⚠️ Ahora mismo no se puede leer tu apuesta guardada. Recarga en un momento.")
         es_mundial = "mundial" in id_evento
-        
-        if es_mundial:
-            if not df_bets_m.empty:
-                mi_fila = df_bets_m[(df_bets_m['usuario'] == st.session_state.usuario_actual) & (df_bets_m['tipo'] == id_evento)]
-                if not mi_fila.empty:
-                    datos = mi_fila.iloc[-1]['datos_encriptados']
-                    mi_apuesta_actual = desencriptar(datos).split(",")
-        else:
-            if not df_bets_c.empty:
-                mi_fila = df_bets_c[(df_bets_c['usuario'] == st.session_state.usuario_actual) & (df_bets_c['carrera'] == id_evento)]
-                if not mi_fila.empty:
-                    datos = mi_fila.iloc[-1]['datos_encriptados']
-                    mi_apuesta_actual = desencriptar(datos).split(",")
 
         if mi_apuesta_actual:
             with st.expander("✅ Ya tienes una apuesta guardada (Click para ver)", expanded=True):
@@ -394,8 +433,7 @@ else:
                 
                 if len(seleccion) == 22:
                     if st.button("Enviar Predicción Mundial"):
-                        cadena = ",".join(seleccion)
-                        encriptado = encriptar(cadena)
+                        encriptado = encriptar(seleccion)
                         ok = guardar_apuesta(st.session_state.usuario_actual, id_evento, encriptado, "mundial")
                         if ok: st.balloons(); st.success("✅ ¡Guardado!")
                         else: st.error("Error al guardar")
@@ -411,69 +449,45 @@ else:
                         seleccion_carrera.append(val)
                 if "-" not in seleccion_carrera and len(set(seleccion_carrera)) == 10:
                     if st.button("Enviar Porra"):
-                        cadena = ",".join(seleccion_carrera)
-                        encriptado = encriptar(cadena)
+                        encriptado = encriptar(seleccion_carrera)
                         ok = guardar_apuesta(st.session_state.usuario_actual, id_evento, encriptado, "carrera")
                         if ok: st.balloons(); st.success("✅ ¡Guardado!")
                         else: st.error("Error al guardar")
                 else: st.warning("Completa los 10 sin repetir.")
 
     # --- TAB 2: CLASIFICACIÓN ---
-    with tabs[1]:
+    with tabs[1], tramo("pestana", pestana="clasificacion"):
         st.header("Clasificaciones")
         if st.button("🔄 Refrescar"):
-            obtener_datos_resultados.clear()
+            limpiar_resultados()
             st.rerun()
+        proximo = calendario.proximo_cambio()
+        if proximo: st.caption(f"⏱️ Próximo cierre/apertura: {proximo.strftime('%d/%m/%Y %H:%M')} (las apuestas se revelan al cerrar)")
         
-        df_res, df_bets_c, df_bets_m = obtener_datos_resultados()
-        ranking_global = {}
-        
-        if not df_res.empty:
-            for index, row_res in df_res.iterrows():
-                carrera_id = row_res['carrera']
-                if not row_res['p1']: continue
-                res_oficial = [row_res[f'p{i}'] for i in range(1, 23) if f'p{i}' in row_res and row_res[f'p{i}']]
-                es_mundial = "mundial" in carrera_id
-                
-                if es_mundial and not df_bets_m.empty: bets = df_bets_m[df_bets_m['tipo'] == carrera_id]
-                elif not es_mundial and not df_bets_c.empty: bets = df_bets_c[df_bets_c['carrera'] == carrera_id]
-                else: bets = pd.DataFrame()
-                
-                apuestas_del_gp = {} 
-                res_gp = []
-                if not bets.empty:
-                    for idx, bet in bets.iterrows():
-                        user = bet['usuario']
-                        estado_ev = verificar_estado_evento(carrera_id, df_cal)
-                        if estado_ev == "CERRADO":
-                            pred_str = desencriptar(bet['datos_encriptados'])
-                            if pred_str != "Error/Corrupto":
-                                pred_list = pred_str.split(",")
-                                apuestas_del_gp[user] = pred_list
-                                pts = calcular_puntos_mundial(pred_list, res_oficial) if es_mundial else calcular_puntos_carrera(pred_list, res_oficial)
-                                ranking_global[user] = ranking_global.get(user, 0) + pts
-                                res_gp.append({"Usuario": user, "Puntos": pts})
-                        else: res_gp.append({"Usuario": user, "Puntos": "⏳"})
-
-                with st.expander(f"🏁 Detalles: {carrera_id}"):
-                    st.dataframe(pd.DataFrame(res_gp), use_container_width=True)
-                    if apuestas_del_gp:
-                        st.caption("🕵️ Ver apuesta completa de:")
-                        usuarios_en_gp = list(apuestas_del_gp.keys())
-                        usuario_a_espiar = st.selectbox("Seleccionar:", ["-"] + usuarios_en_gp, key=f"spy_{carrera_id}")
-                        if usuario_a_espiar != "-":
-                            st.markdown(f"**Apuesta de {usuario_a_espiar}**")
-                            lista_apostada = apuestas_del_gp[usuario_a_espiar]
-                            data_comp = []
-                            rango = 22 if es_mundial else 10
-                            for i in range(rango):
-                                p_apostado = lista_apostada[i] if i < len(lista_apostada) else "-"
-                                p_real = res_oficial[i] if i < len(res_oficial) else "-"
-                                icon = "❌"
-                                if p_apostado == p_real: icon = "✅"
-                                elif p_apostado in res_oficial: icon = "⚠️"
-                                data_comp.append({"Pos": i+1, "Apuesta": p_apostado, "Real": p_real, "Estado": icon})
-                            st.dataframe(pd.DataFrame(data_comp), use_container_width=True)
+        try: clasificacion = obtener_clasificacion(calendario.epoca())
+        except ERRORES_ALMACEN:
+            st.error("No se pudo cargar la clasificación. Recarga en un momento.")
+            clasificacion = Clasificacion([], {})
+        if clasificacion.corruptos and st.session_state.rol_usuario == "admin":
+            st.warning(f"⚠️ {clasificacion.corruptos} apuestas no se pudieron descifrar y no puntúan.")
+
+        # Resumen paginado: las tablas de detalle solo se construyen para el evento abierto
+        if clasificacion.eventos:
+            n_paginas = -(-len(clasificacion.resumen) // EVENTOS_POR_PAGINA)
+            pagina = st.number_input("Página de eventos", 1, n_paginas, 1) if n_paginas > 1 else 1
+            inicio = (pagina - 1) * EVENTOS_POR_PAGINA
+            df_pagina = clasificacion.resumen.iloc[inicio:inicio + EVENTOS_POR_PAGINA]
+            st.dataframe(df_pagina, use_container_width=True)
+            carrera_id = st.selectbox("🏁 Ver detalles de:", ["-"] + df_pagina["Evento"].tolist())
+            if carrera_id != "-":
+                evento = clasificacion.por_id[carrera_id]
+                st.dataframe(evento.tabla(), use_container_width=True)
+                if evento.apuestas:
+                    st.caption("🕵️ Ver apuesta completa de:")
+                    usuario_a_espiar = st.selectbox("Seleccionar:", ["-"] + list(evento.apuestas), key=f"spy_{carrera_id}")
+                    if usuario_a_espiar != "-":
+                        st.markdown(f"**Apuesta de {usuario_a_espiar}**")
+                        st.dataframe(evento.comparacion(usuario_a_espiar), use_container_width=True)
 
         st.write("---")
         opciones = ["GLOBAL"] + st.session_state.mis_ligas
@@ -482,23 +496,41 @@ else:
              primera_liga = st.session_state.mis_ligas[0]
              if primera_liga in opciones: idx_defecto = opciones.index(primera_liga)
         opcion_liga = st.selectbox("🏆 Filtrar Ranking por Liga:", opciones, index=idx_defecto)
-        
-        if ranking_global:
-            df_rank = pd.DataFrame(list(ranking_global.items()), columns=["Piloto", "Puntos"])
-            if opcion_liga != "GLOBAL":
-                usuarios_liga = []
-                for idx, u_row in df_users.iterrows():
-                    sus_ligas = [l.strip().upper() for l in str(u_row['liga_privada']).split(",")]
-                    if opcion_liga in sus_ligas: usuarios_liga.append(u_row['usuario'])
-                df_rank = df_rank[df_rank['Piloto'].isin(usuarios_liga)]
-            df_rank = df_rank.sort_values("Puntos", ascending=False).reset_index(drop=True)
+
+        if not clasificacion.ranking.empty:
+            df_rank = clasificacion.ranking_de(None if opcion_liga == "GLOBAL" else directorio.miembros_de(opcion_liga))
             col1, col2 = st.columns([3, 1])
             with col1: st.bar_chart(df_rank.set_index("Piloto"))
             with col2: st.dataframe(df_rank, use_container_width=True)
+
+            # Evolución: vista memoizada por liga sobre la matriz de puntos por ronda
+            historial = clasificacion.historial
+            if len(historial.rondas) > 1:
+                with st.expander("📈 Evolución de la temporada"):
+                    miembros = None if opcion_liga == "GLOBAL" else directorio.miembros_de(opcion_liga)
+                    acumulado, posiciones = historial.de(opcion_liga, miembros)
+                    movimientos = historial.movimientos(opcion_liga, miembros)
+                    por_defecto = movimientos["Piloto"].head(5).tolist()
+                    yo = st.session_state.usuario_actual
+                    if yo in acumulado.index and yo not in por_defecto: por_defecto.append(yo)
+                    elegidos = st.multiselect("Jugadores:", movimientos["Piloto"].tolist(),
+                                              default=por_defecto, key=f"evolucion_{opcion_liga}")
+                    if elegidos:
+                        col1, col2 = st.columns(2)
+                        with col1:
+                            st.caption("Posición tras cada ronda")
+                            st.altair_chart(grafico_evolucion(posiciones.loc[elegidos], "Posición", invertir=True),
+                                            use_container_width=True)
+                        with col2:
+                            st.caption("Puntos acumulados")
+                            st.altair_chart(grafico_evolucion(acumulado.loc[elegidos], "Puntos"),
+                                            use_container_width=True)
+                    st.caption("Movimiento: puestos ganados (+) o perdidos (-) en la última ronda")
+                    st.dataframe(movimientos, use_container_width=True)
         else: st.info("Sin datos aún.")
 
     # --- TAB 3: NORMAS ---
-    with tabs[2]:
+    with tabs[2], tramo("pestana", pestana="normas"):
         st.header("📜 Reglamento Oficial")
         st.markdown("""
         ### 1. Formato
@@ -518,11 +550,18 @@ else:
 
     # --- TAB 4: ADMIN RESULTADOS ---
     if st.session_state.rol_usuario == "admin":
-        with tabs[3]:
+        with tabs[3], tramo("pestana", pestana="resultados"):
             st.markdown("### ⚙️ Panel Resultados")
             ev_cargar = st.selectbox("Evento:", df_cal['id_evento'].tolist())
+            try: df_res_admin = obtener_datos_resultados(calendario.epoca())[0]
+            except ERRORES_ALMACEN:
+                st.error("No se pudieron leer los resultados guardados.")
+                df_res_admin = pd.DataFrame()
+            ya_guardado = not df_res_admin.empty and ev_cargar in set(df_res_admin['carrera'])
+            if ya_guardado: st.info("Este evento ya tiene resultado: al guardar se corrige (no se duplica).")
             res_admin = st.multiselect("Resultado Oficial:", PILOTOS_2026)
-            if st.button("Guardar Resultado"):
+            confirmado = st.checkbox("Sustituir el resultado guardado", key=f"sustituir_{ev_cargar}") if ya_guardado else True
+            if st.button("Guardar Resultado", disabled=not res_admin or not confirmado):
                 fila = [ev_cargar] + res_admin
                 while len(fila) < 23: fila.append("")
                 fila.append("TRUE")
@@ -530,21 +569,64 @@ else:
                 if ok: st.success("Guardado")
                 else: st.error("Error al guardar")
 
+            st.write("---")
+            st.markdown("**📥 Importar resultados desde CSV**")
+            st.caption("Columnas: carrera, p1 … p22 y, opcional, oficial (TRUE por defecto). "
+                       "Los eventos que ya tengan resultado se corrigen.")
+            fichero = st.file_uploader("CSV de resultados", type="csv")
+            if fichero is not None:
+                filas_csv, descartadas, avisos = leer_csv_resultados(fichero, set(df_cal['id_evento']))
+                if descartadas: st.error("Filas descartadas (no se importan):\n\n" + "\n".join(f"* {d}" for d in descartadas))
+                for aviso in avisos: st.warning(aviso)
+                if filas_csv:
+                    st.dataframe(pd.DataFrame(filas_csv, columns=COLUMNAS[HOJA_RESULTADOS]), use_container_width=True)
+                    sin_descartadas = st.checkbox(f"Importar sin las {len(descartadas)} filas descartadas") if descartadas else True
+                    if st.button(f"Importar {len(filas_csv)} resultados", disabled=not sin_descartadas):
+                        if importar_resultados_oficiales(filas_csv): st.success("✅ Importados")
+                        else: st.error("Error al importar")
+
     # --- TAB 5: ADMIN USUARIOS ---
     if st.session_state.rol_usuario == "admin":
-        with tabs[4]:
+        with tabs[4], tramo("pestana", pestana="usuarios"):
             st.markdown("### 👥 Control de Acceso")
             if st.button("🔄 Cargar Pendientes"):
-                obtener_datos_maestros.clear()
+                limpiar_maestros()
                 st.rerun()
-            pendientes = df_users[df_users['rol'] == 'pendiente']
+            pendientes = df_users[df_users['rol'] == 'pendiente'] if not df_users.empty else df_users
             if pendientes.empty: st.success("✅ No hay solicitudes.")
             else:
-                for index, row in pendientes.iterrows():
-                    c1, c2, c3, c4 = st.columns([2, 2, 1, 1])
-                    c1.markdown(f"**{row['usuario']}**")
-                    c2.caption(f"Ligas: {row['liga_privada']}")
-                    if c3.button("✅", key=f"ok_{row['usuario']}"):
-                        aprobar_usuario(row['usuario']); st.rerun()
-                    if c4.button("❌", key=f"del_{row['usuario']}"):
-                        borrar_usuario(row['usuario']); st.rerun()
\ No newline at end of file
+                st.dataframe(pendientes[['usuario', 'liga_privada']].rename(
+                    columns={'usuario': "Usuario", 'liga_privada': "Ligas"}), use_container_width=True, hide_index=True)
+                todos = st.checkbox(f"Seleccionar los {len(pendientes)}")
+                lista_pendientes = pendientes['usuario'].tolist()
+                seleccion_usuarios = st.multiselect("Solicitudes seleccionadas:", lista_pendientes,
+                                                    default=lista_pendientes if todos else None)
+                c1, c2 = st.columns(2)
+                if c1.button(f"✅ Aprobar ({len(seleccion_usuarios)})", disabled=not seleccion_usuarios):
+                    if aprobar_usuarios(seleccion_usuarios): st.rerun()
+                    else: st.error("Error al aprobar")
+                if c2.button(f"❌ Rechazar ({len(seleccion_usuarios)})", disabled=not seleccion_usuarios):
+                    if borrar_usuarios(seleccion_usuarios): st.rerun()
+                    else: st.error("Error al rechazar")
+
+    # --- TAB 6: ADMIN RENDIMIENTO ---
+    if st.session_state.rol_usuario == "admin":
+        with tabs[5]:
+            st.markdown("### 📈 Rendimiento de este proceso")
+            st.caption(f"Desde {datetime.fromtimestamp(METRICAS.desde).strftime('%d/%m/%Y %H:%M:%S')}")
+            df_tramos = pd.DataFrame(METRICAS.resumen())
+            if df_tramos.empty: st.info("Sin mediciones aún.")
+            else: st.dataframe(df_tramos.sort_values("Total s", ascending=False), use_container_width=True)
+            st.markdown("**Cachés**")
+            st.dataframe(pd.DataFrame(METRICAS.aciertos_cache()), use_container_width=True)
+            with st.expander("Contadores"):
+                st.dataframe(pd.DataFrame(METRICAS.contadores()), use_container_width=True)
+            texto = METRICAS.exportar_texto()
+            c1, c2 = st.columns(2)
+            c1.download_button("⬇️ Exportar (texto)", texto, file_name="metricas_porra.prom", mime="text/plain")
+            if c2.button("🗑️ Reiniciar métricas"):
+                METRICAS.reiniciar(); st.rerun()
+            with st.expander("Exportación en texto"): st.code(texto)
+
+observar("rerun", time.perf_counter() - _inicio_rerun,
+         vista="app" if st.session_state.logged_in else "acceso")
\ No newline at end of file
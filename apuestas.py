@@ -0,0 +1,74 @@
+"""Parrillas de pilotos y formato binario de las apuestas antes de cifrarlas.
+
+Una apuesta es una lista ordenada de pilotos distintos de una parrilla. En vez
+de guardar los nombres separados por comas, se guarda su número de orden
+entre todas las ordenaciones posibles (código de Lehmer): el top 10 de una
+parrilla de 22 cabe en 6 bytes y el orden completo de los 22, en 9.
+
+Formato v1:  [0x01][versión de parrilla][nº de pilotos][número de orden, big-endian]
+
+Con la cabecera, cualquier apuesta cabe en un solo bloque AES, así que el
+token Fernet queda en 100 caracteres (frente a ~330 del mundial en texto).
+Las filas antiguas (texto 'Verstappen,Hadjar,...') empiezan por una letra y se
+siguen leyendo tal cual. Las parrillas nunca se modifican: si cambia la
+parrilla se añade una versión nueva y las apuestas viejas se leen con la suya.
+"""
+from math import perm
+
+# versión -> parrilla. Solo se añaden versiones, nunca se editan: las apuestas
+# guardadas se leen con la suya. Para cambiar de parrilla, añade una y sube
+# PARRILLA_ACTUAL.
+PARRILLAS = {
+    1: ("Verstappen", "Hadjar", "Leclerc", "Hamilton", "Norris", "Piastri",
+        "Alonso", "Stroll", "Sainz", "Albon", "Russell", "Antonelli",
+        "Bearman", "Ocon", "Gasly", "Colapinto", "Lawson", "Lindblad",
+        "Checo", "Bottas", "Hulkenberg", "Bortoleto"),
+}
+PARRILLA_ACTUAL = 1
+
+# Lista de Pilotos Oficial
+PILOTOS_2026 = list(PARRILLAS[PARRILLA_ACTUAL])
+
+FORMATO_BINARIO = 1
+
+
+def _bytes_orden(n, k):
+    """Bytes necesarios para el número de orden de k pilotos entre n."""
+    return max(1, ((perm(n, k) - 1).bit_length() + 7) // 8)
+
+
+def codificar(pilotos, version=PARRILLA_ACTUAL):
+    """Lista de pilotos -> bytes a cifrar. Si no encaja en la parrilla (nombres
+    desconocidos o repetidos) se guarda como texto, igual que antes."""
+    parrilla = PARRILLAS[version]
+    ids = {p: i for i, p in enumerate(parrilla)}
+    if len(set(pilotos)) != len(pilotos) or any(p not in ids for p in pilotos) or len(pilotos) > 255:
+        return ",".join(pilotos).encode()
+    restantes = list(range(len(parrilla)))
+    orden = 0
+    for i, piloto in enumerate(pilotos):
+        pos = restantes.index(ids[piloto])
+        del restantes[pos]
+        orden = orden * (len(parrilla) - i) + pos
+    k = len(pilotos)
+    return bytes([FORMATO_BINARIO, version, k]) + orden.to_bytes(_bytes_orden(len(parrilla), k), "big")
+
+
+def decodificar(datos):
+    """Bytes descifrados -> lista de pilotos. Lanza ValueError si están mal formados."""
+    if not datos or datos[0] != FORMATO_BINARIO:
+        return datos.decode().split(",")      # formato antiguo: texto separado por comas
+    if len(datos) < 3 or datos[1] not in PARRILLAS:
+        raise ValueError("Apuesta binaria con cabecera desconocida")
+    parrilla = PARRILLAS[datos[1]]
+    n, k = len(parrilla), datos[2]
+    if k > n or len(datos) != 3 + _bytes_orden(n, k):
+        raise ValueError("Apuesta binaria de longitud incorrecta")
+    orden = int.from_bytes(datos[3:], "big")
+    if orden >= perm(n, k): raise ValueError("Apuesta binaria fuera de rango")
+    digitos = []
+    for i in range(k - 1, -1, -1):
+        orden, pos = divmod(orden, n - i)
+        digitos.append(pos)
+    restantes = list(parrilla)
+    return [restantes.pop(pos) for pos in reversed(digitos)]
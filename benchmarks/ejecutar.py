@@ -0,0 +1,229 @@
+"""Benchmarks de la porra contra un Google Sheets falso.
+
+Uso (desde la raíz del repositorio):
+
+    python -m benchmarks.ejecutar                       # 100, 1.000 y 10.000 usuarios
+    python -m benchmarks.ejecutar --usuarios 100 1000 --latencia 50 --repeticiones 3
+
+Reproduce sin Streamlit lo que hace la app en cada flujo (login, formulario de
+apuesta, guardar apuesta, clasificación completa y filtro por liga) y mide la
+mediana y el mínimo de cada operación, junto con las peticiones a Sheets que
+cuesta. Cada ejecución se guarda en benchmarks/resultados/ con el commit
+actual y se compara con la anterior para detectar regresiones.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+
+from almacenamiento import (AlmacenSheets, HOJA_CALENDARIO, HOJA_CARRERA, HOJA_MUNDIAL,
+                            HOJA_RESULTADOS, HOJA_USUARIOS)
+from apuestas import PILOTOS_2026
+from benchmarks.sheets_falso import ClienteFalso, LibroFalso
+from benchmarks.temporada import generar_temporada
+from calendario import compilar_calendario
+from cifrado import Descifrador
+from cola_escritura import ColaEscrituras
+from directorio import DirectorioUsuarios
+from indice_apuestas import IndiceApuestas
+from puntuacion import Clasificacion, HistorialClasificacion, MotorClasificacion
+
+DIRECTORIO_RESULTADOS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "resultados")
+HOJAS_RESULTADOS = (HOJA_RESULTADOS, HOJA_CARRERA, HOJA_MUNDIAL)
+
+# Apuestas por lote en la medición del volcado de la cola
+TAM_VOLCADO = 100
+
+
+def medir(funcion, libro, repeticiones, preparar=None):
+    """Mediana y mínimo (ms) de funcion(*preparar()) y peticiones a Sheets por llamada.
+
+    preparar() se ejecuta fuera del cronómetro y devuelve los argumentos.
+    """
+    tiempos, peticiones = [], 0
+    for _ in range(repeticiones):
+        argumentos = preparar() if preparar else ()
+        antes = libro.peticiones
+        inicio = time.perf_counter()
+        funcion(*argumentos)
+        tiempos.append(time.perf_counter() - inicio)
+        peticiones = max(peticiones, libro.peticiones - antes)
+    return {"mediana_ms": round(statistics.median(tiempos) * 1000, 3),
+            "min_ms": round(min(tiempos) * 1000, 3), "peticiones": peticiones}
+
+
+def escenario(n_usuarios, latencia=0.0, repeticiones=5, semilla=2026):
+    """{operación: medidas} para una temporada de n_usuarios."""
+    temporada = generar_temporada(n_usuarios, semilla=semilla)
+    libro = LibroFalso(temporada.hojas, latencia)
+    ahora = temporada.ahora
+    rnd = random.Random(semilla)
+    usuario, password = rnd.choice(temporada.usuarios)
+    liga = max(temporada.ligas, key=temporada.ligas.get) if temporada.ligas else ""
+    nuevo_almacen = lambda: (AlmacenSheets(None, cliente=ClienteFalso(libro)),)
+    r = {}
+
+    # --- LOGIN (obtener_datos_maestros + verificar_login) ---
+    def cargar_maestros(almacen):
+        tablas = almacen.leer_hojas([HOJA_CALENDARIO, HOJA_USUARIOS])
+        df_cal = tablas[HOJA_CALENDARIO]
+        return df_cal, compilar_calendario(df_cal), DirectorioUsuarios(tablas[HOJA_USUARIOS])
+
+    r["login_sin_cache"] = medir(lambda a: cargar_maestros(a)[2].login(usuario, password),
+                                 libro, repeticiones, nuevo_almacen)
+    almacen, = nuevo_almacen()
+    df_cal, calendario, directorio = cargar_maestros(almacen)
+    r["login"] = medir(lambda: directorio.login(usuario, password), libro, repeticiones)
+
+    # --- RESULTADOS Y APUESTAS (obtener_datos_resultados) ---
+    epoca = calendario.epoca(ahora)
+    r["carga_resultados_sin_cache"] = medir(lambda a: a.sincronizar_hojas(HOJAS_RESULTADOS, epoca),
+                                            libro, repeticiones, nuevo_almacen)
+    almacen.sincronizar_hojas(HOJAS_RESULTADOS, epoca)
+    r["carga_resultados_incremental"] = medir(lambda: almacen.sincronizar_hojas(HOJAS_RESULTADOS, epoca),
+                                              libro, repeticiones)
+    tablas = almacen.sincronizar_hojas(HOJAS_RESULTADOS, epoca)
+    df_res, df_bets_c, df_bets_m = (tablas[h] for h in HOJAS_RESULTADOS)
+
+    # --- FORMULARIO DE APUESTA (pestaña Hacer Porra) ---
+    ruta_cola = os.path.join(tempfile.mkdtemp(prefix="bench_porra_"), "cola.db")
+    cola = ColaEscrituras(almacen, ruta_cola)
+    id_evento = df_cal['id_evento'].iloc[calendario.primer_abierto(ahora)]
+    hoja = HOJA_MUNDIAL if "mundial" in id_evento else HOJA_CARRERA
+
+    r["indice_apuestas"] = medir(lambda: IndiceApuestas(df_bets_c, df_bets_m), libro, repeticiones)
+    indice = IndiceApuestas(df_bets_c, df_bets_m)
+
+    def formulario(descifrador, mis_apuestas):
+        """mi_apuesta() de app.py; mis_apuestas hace de st.session_state."""
+        calendario.estado(id_evento, ahora)
+        if id_evento not in mis_apuestas:
+            datos = cola.pendiente(hoja, usuario, id_evento) or indice.ultima(hoja, usuario, id_evento)
+            if not datos: return []
+            mis_apuestas[id_evento] = descifrador.desencriptar(datos)
+        return mis_apuestas[id_evento]
+
+    r["formulario_apuesta"] = medir(formulario, libro, repeticiones, lambda: (Descifrador(temporada.clave), {}))
+    sesion = (Descifrador(temporada.clave), {})
+    formulario(*sesion)
+    r["formulario_apuesta_rerun"] = medir(lambda: formulario(*sesion), libro, repeticiones)
+
+    # --- CLASIFICACIÓN ---
+    esta_cerrado = lambda ev: calendario.estado(ev, ahora) == "CERRADO"
+    def clasificar(motor, descifrador):
+        return Clasificacion(*motor.actualizar(df_res, df_bets_c, df_bets_m, esta_cerrado, descifrador))
+
+    r["clasificacion_sin_cache"] = medir(clasificar, libro, repeticiones,
+                                         lambda: (MotorClasificacion(), Descifrador(temporada.clave)))
+    motor, descifrador = MotorClasificacion(), Descifrador(temporada.clave)
+    clasificacion = clasificar(motor, descifrador)
+    r["clasificacion_caliente"] = medir(lambda: clasificar(motor, descifrador), libro, repeticiones)
+    r["filtro_liga"] = medir(lambda: clasificacion.ranking_de(directorio.miembros_de(liga)),
+                             libro, repeticiones)
+    etiquetas = [ev.carrera_id for ev in clasificacion.eventos if ev.cerrado]
+    matriz = clasificacion.historial.puntos
+    r["historial"] = medir(lambda h: h.de(), libro, repeticiones,
+                           lambda: (HistorialClasificacion(matriz, etiquetas),))
+    r["historial_liga"] = medir(lambda h: h.de(liga, directorio.miembros_de(liga)), libro, repeticiones,
+                                lambda: (HistorialClasificacion(matriz, etiquetas),))
+
+    # --- GUARDAR APUESTA ---
+    cifrador = Descifrador(temporada.clave)
+    def apuesta():
+        return cifrador.encriptar(rnd.sample(PILOTOS_2026, 10))
+
+    r["guardar_apuesta"] = medir(
+        lambda datos: cola.encolar(hoja, usuario, id_evento, str(datetime.now()), datos),
+        libro, repeticiones, lambda: (apuesta(),))
+    r["guardar_apuesta_directa"] = medir(
+        lambda datos: almacen.guardar_apuesta(hoja, usuario, id_evento, str(datetime.now()), datos),
+        libro, repeticiones, lambda: (apuesta(),))
+
+    def encolar_lote():
+        for u, _ in rnd.sample(temporada.usuarios, min(TAM_VOLCADO, len(temporada.usuarios))):
+            cola.encolar(hoja, u, id_evento, str(datetime.now()), apuesta())
+        return ()
+
+    while cola.volcar(): pass
+    r["volcado_cola"] = medir(cola.volcar, libro, repeticiones, encolar_lote)
+    return r
+
+
+# --- ALMACENAMIENTO Y COMPARACIÓN ---
+def _commit():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, check=True).stdout.strip()
+        sucio = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"],
+                               capture_output=True, text=True, check=True).stdout.strip()
+        return commit + ("+cambios" if sucio else "")
+    except (OSError, subprocess.CalledProcessError):
+        return "desconocido"
+
+
+def ultima_ejecucion(directorio=DIRECTORIO_RESULTADOS):
+    """Ruta del último resultado guardado, o None."""
+    if not os.path.isdir(directorio): return None
+    ficheros = sorted(f for f in os.listdir(directorio) if f.endswith(".json"))
+    return os.path.join(directorio, ficheros[-1]) if ficheros else None
+
+
+def guardar(informe, directorio=DIRECTORIO_RESULTADOS):
+    os.makedirs(directorio, exist_ok=True)
+    nombre = f"{informe['fecha'].replace(':', '').replace('-', '')}-{informe['commit']}.json"
+    ruta = os.path.join(directorio, nombre)
+    with open(ruta, "w") as f:
+        json.dump(informe, f, indent=2, ensure_ascii=False)
+    return ruta
+
+
+def imprimir(informe, anterior=None):
+    base = (anterior or {}).get("resultados", {})
+    for n, medidas in informe["resultados"].items():
+        print(f"\n== {int(n):,} usuarios ==".replace(",", "."))
+        print(f"{'operación':<30}{'mediana ms':>12}{'mín ms':>12}{'peticiones':>12}{'vs anterior':>14}")
+        for op, m in medidas.items():
+            previa = base.get(n, {}).get(op)
+            delta = ""
+            if previa and previa["mediana_ms"]:
+                delta = f"{(m['mediana_ms'] / previa['mediana_ms'] - 1) * 100:+.1f}%"
+            print(f"{op:<30}{m['mediana_ms']:>12.3f}{m['min_ms']:>12.3f}{m['peticiones']:>12}{delta:>14}")
+    if anterior: print(f"\nComparado con {anterior['commit']} ({anterior['fecha']})")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks de la porra con un Sheets falso")
+    parser.add_argument("--usuarios", type=int, nargs="+", default=[100, 1_000, 10_000])
+    parser.add_argument("--latencia", type=float, default=0.0, help="ms por petición a Sheets")
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--semilla", type=int, default=2026)
+    parser.add_argument("--comparar", help="JSON de una ejecución anterior (por defecto, la última)")
+    parser.add_argument("--no-guardar", action="store_true")
+    args = parser.parse_args(argv)
+
+    ruta_anterior = args.comparar or ultima_ejecucion()
+    anterior = None
+    if ruta_anterior:
+        with open(ruta_anterior) as f:
+            anterior = json.load(f)
+
+    informe = {"commit": _commit(), "fecha": datetime.now().strftime("%Y-%m-%dT%H:%M:%S"),
+               "python": platform.python_version(), "plataforma": platform.platform(),
+               "parametros": {"latencia_ms": args.latencia, "repeticiones": args.repeticiones,
+                              "semilla": args.semilla},
+               "resultados": {}}
+    for n in args.usuarios:
+        print(f"Generando temporada de {n} usuarios...")
+        informe["resultados"][str(n)] = escenario(n, args.latencia / 1000, args.repeticiones, args.semilla)
+    imprimir(informe, anterior)
+    if not args.no_guardar: print(f"\nGuardado en {guardar(informe)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+"""Google Sheets falso y en memoria, con la parte de gspread que usa la porra.
+
+Cubre la superficie de la app original (`worksheet`, `get_all_records`,
+`get_all_values`, `append_row`, `update_cell`, `find`, `delete_rows`) y la del
+almacén actual (`batch_get`, `batch_update`, `append_rows`, `update`,
+`values_batch_get` y el `batch_update` del libro con `deleteDimension`).
+Cada llamada que en gspread sería una petición HTTP duerme `latencia`
+segundos y suma uno a `LibroFalso.peticiones`, así que un benchmark mide
+también cuántas idas y vueltas cuesta cada operación.
+
+`ClienteFalso` tiene la interfaz de `cliente_sheets.ClienteSheets` y se inyecta
+con `AlmacenSheets(None, cliente=ClienteFalso(libro))`.
+"""
+import re
+import threading
+import time
+
+_RE_A1 = re.compile(r"^([A-Z]*)(\d*)(?::([A-Z]*)(\d*))?$")
+
+
+class ErrorFalso(Exception):
+    """Imita gspread.exceptions.APIError: el código HTTP va en .code."""
+
+    def __init__(self, code, mensaje):
+        super().__init__(mensaje)
+        self.code = code
+
+
+class Celda:
+    def __init__(self, row, col, value):
+        self.row, self.col, self.value = row, col, value
+
+
+def _columna(letras):
+    n = 0
+    for c in letras: n = n * 26 + ord(c) - 64
+    return n
+
+
+def _letras(n):
+    texto = ""
+    while n:
+        n, resto = divmod(n - 1, 26)
+        texto = chr(65 + resto) + texto
+    return texto
+
+
+def _recortar(filas):
+    """Como la API: sin celdas vacías al final de cada fila ni filas vacías al final."""
+    filas = [list(f) for f in filas]
+    for f in filas:
+        while f and f[-1] == "": f.pop()
+    while filas and not filas[-1]: filas.pop()
+    return filas
+
+
+def _numerizar(valor):
+    try: return int(valor)
+    except ValueError: return valor
+
+
+class HojaFalsa:
+    def __init__(self, libro, title, filas, id=0):
+        self.libro = libro
+        self.spreadsheet = libro
+        self.title = title
+        self.id = id
+        self.filas = [[str(v) for v in f] for f in filas]
+
+    def _rango(self, a1):
+        """(fila1, col1, fila2, col2) de un rango A1, con índices desde 1."""
+        m = _RE_A1.match(a1)
+        if m is None: raise ErrorFalso(400, f"Unable to parse range: {a1}")
+        c1, r1, c2, r2 = m.groups()
+        abierto = ":" in a1
+        col1 = _columna(c1) if c1 else 1
+        fila1 = int(r1) if r1 else 1
+        col2 = _columna(c2) if c2 else (10 ** 6 if abierto else col1)
+        fila2 = int(r2) if r2 else (len(self.filas) if abierto else fila1)
+        if fila1 > max(len(self.filas), 1):
+            raise ErrorFalso(400, f"Range ('{self.title}'!{a1}) exceeds grid limits")
+        return fila1, col1, fila2, col2
+
+    def _leer(self, a1=None):
+        if a1 is None: return _recortar(self.filas)
+        fila1, col1, fila2, col2 = self._rango(a1)
+        return _recortar(f[col1 - 1:col2] for f in self.filas[fila1 - 1:fila2])
+
+    def _escribir(self, fila, col, valores):
+        for i, valores_fila in enumerate(valores):
+            while len(self.filas) < fila + i: self.filas.append([])
+            destino = self.filas[fila + i - 1]
+            for j, v in enumerate(valores_fila):
+                while len(destino) < col + j: destino.append("")
+                destino[col + j - 1] = str(v)
+
+    def _anadir(self, filas):
+        primera = len(self.filas) + 1
+        self.filas.extend([str(v) for v in f] for f in filas)
+        ancho = max((len(f) for f in filas), default=1)
+        rango = f"'{self.title}'!A{primera}:{_letras(ancho)}{primera + len(filas) - 1}"
+        return {"updates": {"updatedRange": rango, "updatedRows": len(filas)}}
+
+    # --- LECTURA ---
+    def get_all_values(self):
+        with self.libro._peticion():
+            filas = self._leer()
+            ancho = max((len(f) for f in filas), default=0)
+            return [f + [""] * (ancho - len(f)) for f in filas]
+
+    def get_all_records(self):
+        valores = self.get_all_values()
+        if not valores: return []
+        return [dict(zip(valores[0], map(_numerizar, f))) for f in valores[1:]]
+
+    def batch_get(self, rangos):
+        with self.libro._peticion():
+            return [self._leer(r) for r in rangos]
+
+    def find(self, texto, in_column=None):
+        with self.libro._peticion():
+            for i, f in enumerate(self.filas):
+                for j, v in enumerate(f):
+                    if v == str(texto) and in_column in (None, j + 1): return Celda(i + 1, j + 1, v)
+            return None
+
+    # --- ESCRITURA ---
+    def append_row(self, fila):
+        return self.append_rows([fila])
+
+    def append_rows(self, filas):
+        with self.libro._peticion():
+            return self._anadir(filas)
+
+    def update_cell(self, fila, col, valor):
+        with self.libro._peticion():
+            self._escribir(fila, col, [[valor]])
+
+    def update(self, range_name=None, values=None):
+        with self.libro._peticion():
+            fila, col, _, _ = self._rango(range_name)
+            self._escribir(fila, col, values)
+
+    def batch_update(self, datos):
+        with self.libro._peticion():
+            for d in datos:
+                fila, col, _, _ = self._rango(d["range"])
+                self._escribir(fila, col, d["values"])
+
+    def delete_rows(self, inicio, fin=None):
+        with self.libro._peticion():
+            del self.filas[inicio - 1:(fin or inicio)]
+
+
+class LibroFalso:
+    """Spreadsheet en memoria: {nombre de pestaña: filas con cabecera}."""
+
+    def __init__(self, hojas, latencia=0.0):
+        self.latencia = latencia
+        self.peticiones = 0
+        self._lock = threading.RLock()
+        self._hojas = {nombre: HojaFalsa(self, nombre, filas, i) for i, (nombre, filas) in enumerate(hojas.items())}
+
+    class _Peticion:
+        def __init__(self, libro): self.libro = libro
+        def __enter__(self):
+            if self.libro.latencia: time.sleep(self.libro.latencia)
+            self.libro._lock.acquire()
+            self.libro.peticiones += 1
+        def __exit__(self, *exc): self.libro._lock.release()
+
+    def _peticion(self):
+        return LibroFalso._Peticion(self)
+
+    def worksheet(self, nombre):
+        with self._peticion():
+            if nombre not in self._hojas: raise ErrorFalso(404, f"WorksheetNotFound: {nombre}")
+            return self._hojas[nombre]
+
+    def worksheets(self):
+        with self._peticion():
+            return list(self._hojas.values())
+
+    def batch_update(self, cuerpo):
+        """Solo deleteDimension de filas, aplicadas en orden como hace la API."""
+        with self._peticion():
+            por_id = {h.id: h for h in self._hojas.values()}
+            for peticion in cuerpo["requests"]:
+                rango = peticion["deleteDimension"]["range"]
+                del por_id[rango["sheetId"]].filas[rango["startIndex"]:rango["endIndex"]]
+            return {"replies": [{} for _ in cuerpo["requests"]]}
+
+    def values_batch_get(self, rangos, params=None):
+        with self._peticion():
+            respuesta = []
+            for rango in rangos:
+                nombre, _, a1 = rango.partition("!")
+                if nombre.startswith("'"): nombre = nombre[1:-1].replace("''", "'")
+                if nombre not in self._hojas: raise ErrorFalso(400, f"Unable to parse range: {rango}")
+                valores = self._hojas[nombre]._leer(a1 or None)
+                respuesta.append({"range": rango, **({"values": valores} if valores else {})})
+            return {"valueRanges": respuesta}
+
+
+class ClienteFalso:
+    """Misma interfaz que ClienteSheets (libro, hoja, ejecutar, en_libro, invalidar)."""
+
+    def __init__(self, libro):
+        self._libro = libro
+        self._hojas = {}
+
+    def libro(self):
+        return self._libro
+
+    def hoja(self, nombre):
+        if nombre not in self._hojas: self._hojas[nombre] = self._libro.worksheet(nombre)
+        return self._hojas[nombre]
+
+    def invalidar(self, reautorizar=False):
+        self._hojas.clear()
+
+    def ejecutar(self, nombre, operacion):
+        return operacion(self.hoja(nombre))
+
+    def en_libro(self, operacion):
+        return operacion(self._libro)
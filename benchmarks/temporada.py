@@ -0,0 +1,90 @@
+"""Generador de temporadas sintéticas para los benchmarks.
+
+`generar_temporada(n_usuarios)` devuelve las filas de todas las hojas (con
+cabecera, como las vería gspread): N usuarios repartidos en L ligas, un
+calendario con el mundial y 24 GPs, apuestas cifradas con Fernet de casi todos
+los usuarios en cada evento ya jugado (y en el siguiente) y los resultados
+oficiales de los GPs cerrados. Con la misma semilla sale siempre lo mismo,
+salvo los tokens Fernet, que llevan hora y IV aleatorio.
+"""
+import random
+from datetime import datetime, timedelta
+
+from cryptography.fernet import Fernet
+
+from almacenamiento import (COLUMNAS, HOJA_CALENDARIO, HOJA_CARRERA, HOJA_MUNDIAL, HOJA_RESULTADOS,
+                            HOJA_USUARIOS)
+from apuestas import PILOTOS_2026, codificar
+from calendario import MADRID
+
+NUM_GPS = 24
+INICIO_TEMPORADA = datetime(2026, 3, 6, 12, 30)
+
+
+class Temporada:
+    def __init__(self, hojas, clave, ahora, usuarios, ligas):
+        self.hojas = hojas          # hoja -> filas (la primera es la cabecera)
+        self.clave = clave          # clave Fernet de las apuestas
+        self.ahora = ahora          # instante "actual" de la temporada (Europe/Madrid)
+        self.usuarios = usuarios    # [(usuario, password)] de usuarios aprobados
+        self.ligas = ligas          # {liga: nº de miembros}
+
+
+def _ligas_de(rnd, ligas):
+    """0 a 3 ligas por usuario; unas pocas ligas grandes y muchas pequeñas."""
+    n = rnd.choices([0, 1, 2, 3], weights=[2, 5, 2, 1])[0]
+    return sorted({ligas[min(int(rnd.paretovariate(1.2)) - 1, len(ligas) - 1)] for _ in range(n)})
+
+
+def generar_temporada(n_usuarios, n_ligas=None, gps_cerrados=16, participacion=0.9, semilla=2026,
+                      formato_texto=False):
+    """Temporada con gps_cerrados GPs ya cerrados (con resultado) y el siguiente abierto.
+
+    formato_texto=True cifra las apuestas como las filas antiguas ('A,B,C...').
+    """
+    rnd = random.Random(semilla)
+    clave = Fernet.generate_key()
+    fernet = Fernet(clave)
+    sellar = lambda pilotos: fernet.encrypt(",".join(pilotos).encode() if formato_texto
+                                            else codificar(pilotos)).decode()
+    n_ligas = n_ligas or max(1, n_usuarios // 20)
+    nombres_ligas = [f"LIGA{i:04d}" for i in range(1, n_ligas + 1)]
+
+    # Calendario: el mundial cierra antes del GP 1; un GP cada dos semanas
+    fechas = {"mundial": INICIO_TEMPORADA - timedelta(hours=1)}
+    for i in range(1, NUM_GPS + 1):
+        fechas[f"gp_{i:02d}"] = INICIO_TEMPORADA + timedelta(days=14 * (i - 1))
+    calendario = [COLUMNAS[HOJA_CALENDARIO]] + [
+        [ev, "Mundial de Pilotos" if ev == "mundial" else f"GP {ev[3:]}", f.strftime("%d/%m/%Y %H:%M:%S")]
+        for ev, f in fechas.items()]
+    ahora = MADRID.localize(fechas[f"gp_{gps_cerrados:02d}"] + timedelta(days=1))
+
+    usuarios, filas_usuarios, miembros = [], [COLUMNAS[HOJA_USUARIOS]], {}
+    for i in range(1, n_usuarios + 1):
+        usuario, password = f"user{i:05d}", f"pw{i:05d}"
+        rol = "admin" if i == 1 else ("pendiente" if rnd.random() < 0.02 else "user")
+        ligas = _ligas_de(rnd, nombres_ligas)
+        filas_usuarios.append([usuario, password, rol, ", ".join(ligas)])
+        if rol != "pendiente": usuarios.append((usuario, password))
+        for liga in ligas: miembros[liga] = miembros.get(liga, 0) + 1
+
+    # Apuestas: GPs cerrados + el siguiente (abierto) y el mundial
+    fecha_apuesta = (ahora - timedelta(days=2)).strftime("%Y-%m-%d %H:%M:%S.%f")
+    eventos = [f"gp_{i:02d}" for i in range(1, min(gps_cerrados + 1, NUM_GPS) + 1)]
+    carrera, mundial = [COLUMNAS[HOJA_CARRERA]], [COLUMNAS[HOJA_MUNDIAL]]
+    for usuario, _ in usuarios:
+        if rnd.random() < participacion:
+            parrilla = rnd.sample(PILOTOS_2026, len(PILOTOS_2026))
+            mundial.append([usuario, "mundial", fecha_apuesta, sellar(parrilla)])
+        for ev in eventos:
+            if rnd.random() < participacion:
+                top10 = rnd.sample(PILOTOS_2026, 10)
+                carrera.append([usuario, ev, fecha_apuesta, sellar(top10)])
+
+    resultados = [COLUMNAS[HOJA_RESULTADOS]]
+    for ev in eventos[:gps_cerrados]:
+        resultados.append([ev] + rnd.sample(PILOTOS_2026, len(PILOTOS_2026)) + ["TRUE"])
+
+    hojas = {HOJA_USUARIOS: filas_usuarios, HOJA_CALENDARIO: calendario, HOJA_CARRERA: carrera,
+             HOJA_MUNDIAL: mundial, HOJA_RESULTADOS: resultados}
+    return Temporada(hojas, clave, ahora, usuarios, miembros)
@@ -0,0 +1,114 @@
+"""Calendario compilado: estado de cada evento con una búsqueda binaria.
+
+Todas las fechas límite se ordenan una vez en un array. Para un instante dado,
+`bisect` dice cuántas han pasado, y el estado de cualquier evento sale de
+comparar ese número con la posición de su límite y la del evento anterior.
+El mismo array da el próximo instante en que algo cambia de estado, que sirve
+para caducar cachés justo en el cierre.
+"""
+import time
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+
+import pandas as pd
+import pytz
+
+MADRID = pytz.timezone('Europe/Madrid')
+
+# Formatos de fecha_limite en la hoja, por orden de preferencia
+FORMATOS_FECHA = ("%d/%m/%Y %H:%M:%S", "%d/%m/%Y %H:%M")
+
+
+def parsear_fechas(serie):
+    """Columna de texto -> fechas Europe/Madrid (NaT si no encaja en ningún formato).
+
+    Vectorizado: una pasada por formato sobre toda la columna. Una hora que no
+    existe por el cambio de hora se adelanta una hora, como hacía pytz.localize.
+    """
+    texto = serie.astype(str)
+    fechas = pd.Series(pd.NaT, index=serie.index, dtype="datetime64[ns]")
+    for formato in FORMATOS_FECHA:
+        faltan = fechas.isna()
+        if not faltan.any(): break
+        fechas[faltan] = pd.to_datetime(texto[faltan], format=formato, errors="coerce")
+    return fechas.dt.tz_localize(MADRID, ambiguous=False, nonexistent=pd.Timedelta(hours=1))
+
+
+def _marca(fecha):
+    if fecha is None: return None
+    try:
+        if fecha != fecha: return None   # NaT / NaN
+    except TypeError:
+        pass
+    return fecha.timestamp()
+
+
+class CalendarioCompilado:
+    """Se construye con df_cal (columnas id_evento y fecha_dt) en su orden original."""
+
+    def __init__(self, df_cal):
+        ids = df_cal['id_evento'].tolist() if not df_cal.empty else []
+        marcas = [_marca(f) for f in df_cal['fecha_dt']] if ids else []
+        self.ids = ids
+        self._limite = {}
+        self._previo = {}
+        for idx, id_evento in enumerate(ids):
+            if id_evento in self._limite: continue
+            self._limite[id_evento] = marcas[idx]
+            if idx == 0: self._previo[id_evento] = None
+            elif id_evento == 'gp_01': self._previo[id_evento] = marcas[0]
+            else: self._previo[id_evento] = marcas[idx - 1]
+        self.instantes = sorted({m for m in marcas if m is not None})
+        rango = {m: i for i, m in enumerate(self.instantes)}
+        # Posición de cada límite en el array ordenado (None si no hay fecha)
+        self._rango_limite = {e: rango.get(m) for e, m in self._limite.items()}
+        self._rango_previo = {e: rango.get(m) for e, m in self._previo.items()}
+
+    def _contar(self, ahora):
+        t = time.time() if ahora is None else (ahora.timestamp() if isinstance(ahora, datetime) else ahora)
+        # (nº de límites < t, nº de límites <= t)
+        return bisect_left(self.instantes, t), bisect_right(self.instantes, t)
+
+    def estado(self, id_evento, ahora=None, _cuenta=None):
+        """'ABIERTO' | 'PENDIENTE' | 'CERRADO' | 'ERROR', igual que verificar_estado_evento."""
+        if id_evento not in self._limite: return 'ERROR'
+        rango_limite = self._rango_limite[id_evento]
+        if rango_limite is None: return 'ERROR'
+        pasados, alcanzados = _cuenta or self._contar(ahora)
+        if rango_limite < pasados: return 'CERRADO'           # ahora > fecha_limite
+        rango_previo = self._rango_previo[id_evento]
+        if rango_previo is not None and alcanzados <= rango_previo: return 'PENDIENTE'   # ahora < límite previo
+        return 'ABIERTO'
+
+    def estados(self, ahora=None):
+        """Estado de todos los eventos con una sola búsqueda."""
+        cuenta = self._contar(ahora)
+        return {e: self.estado(e, _cuenta=cuenta) for e in self._limite}
+
+    def primer_abierto(self, ahora=None):
+        """Índice (en el orden del calendario) del primer evento ABIERTO, o 0."""
+        cuenta = self._contar(ahora)
+        for idx, id_evento in enumerate(self.ids):
+            if self.estado(id_evento, _cuenta=cuenta) == 'ABIERTO': return idx
+        return 0
+
+    def epoca(self, ahora=None):
+        """Número que cambia en cada instante en que algún evento cambia de estado.
+
+        Usado como argumento de funciones cacheadas, hace que su caché caduque
+        exactamente en el cierre (o apertura) siguiente.
+        """
+        pasados, alcanzados = self._contar(ahora)
+        return pasados + alcanzados
+
+    def proximo_cambio(self, ahora=None):
+        """Fecha (Europe/Madrid) del siguiente cambio de estado, o None si ya no quedan."""
+        _, alcanzados = self._contar(ahora)
+        if alcanzados >= len(self.instantes): return None
+        return datetime.fromtimestamp(self.instantes[alcanzados], MADRID)
+
+
+def compilar_calendario(df_cal):
+    """Añade fecha_dt a df_cal (en su sitio) y devuelve su CalendarioCompilado."""
+    if not df_cal.empty: df_cal['fecha_dt'] = parsear_fechas(df_cal['fecha_limite'])
+    return CalendarioCompilado(df_cal)
@@ -0,0 +1,113 @@
+"""Cifrado de las apuestas selladas.
+
+Un único `Fernet` por clave y una caché LRU de apuestas ya descifradas. Un token
+Fernet nunca cambia de contenido, así que su apuesta cacheada siempre es válida:
+la clasificación no vuelve a descifrar lo que ya vio en otra recarga o sesión.
+Lo que se cifra es el formato compacto de `apuestas` (las filas antiguas en
+texto se siguen leyendo).
+"""
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from cryptography.fernet import Fernet, InvalidToken
+
+from apuestas import codificar, decodificar
+from metricas import contar, tramo
+
+
+class ResultadoLote:
+    """Salida de `desencriptar_lote`: apuestas por token y tokens inválidos."""
+
+    def __init__(self, apuestas, corruptos):
+        self.apuestas = apuestas      # token -> lista de pilotos (no modificar: es la de la caché)
+        self.corruptos = corruptos    # tokens que no se pudieron descifrar
+
+    def __repr__(self):
+        return f"ResultadoLote({len(self.apuestas)} ok, {len(self.corruptos)} corruptos)"
+
+
+class Descifrador:
+    """Fernet reutilizable con caché LRU acotada y descifrado masivo en paralelo."""
+
+    def __init__(self, clave, capacidad=50_000, hilos=4, umbral_paralelo=2_000):
+        self.fernet = Fernet(clave)
+        self.capacidad = capacidad
+        self.hilos = hilos
+        self.umbral_paralelo = umbral_paralelo
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def encriptar(self, pilotos):
+        """Token Fernet (texto) de una lista de pilotos en formato compacto."""
+        return self.fernet.encrypt(codificar(pilotos)).decode()
+
+    def _leer_cache(self, token):
+        with self._lock:
+            apuesta = self._cache.get(token)
+            if apuesta is not None: self._cache.move_to_end(token)
+            return apuesta
+
+    def _guardar_cache(self, pares):
+        with self._lock:
+            for token, apuesta in pares:
+                self._cache[token] = apuesta
+                self._cache.move_to_end(token)
+            while len(self._cache) > self.capacidad:
+                self._cache.popitem(last=False)
+
+    def _descifrar_trozo(self, tokens):
+        ok, malos = [], []
+        for token in tokens:
+            try: ok.append((token, decodificar(self.fernet.decrypt(str(token).encode()))))
+            except (InvalidToken, ValueError, TypeError): malos.append(token)
+        return ok, malos
+
+    def desencriptar(self, token):
+        """Lista de pilotos de un token. Lanza InvalidToken si está corrupto."""
+        apuesta = self._leer_cache(token)
+        contar("descifrado_tokens", origen="cache" if apuesta is not None else "fernet")
+        if apuesta is None:
+            ok, malos = self._descifrar_trozo([token])
+            if malos: raise InvalidToken
+            self._guardar_cache(ok)
+            apuesta = ok[0][1]
+        return list(apuesta)
+
+    def desencriptar_lote(self, tokens):
+        """Descifra muchos tokens de una vez. Devuelve un ResultadoLote.
+
+        Los aciertos de caché no cuestan nada; el resto se reparte en trozos
+        entre un pool de hilos cuando el lote supera `umbral_paralelo`.
+        """
+        with tramo("descifrado_lote"):
+            resultado, descifrados = self._desencriptar_lote(tokens)
+        contar("descifrado_tokens", len(resultado.apuestas) + len(resultado.corruptos) - descifrados, origen="cache")
+        contar("descifrado_tokens", descifrados, origen="fernet")
+        if resultado.corruptos: contar("descifrado_corruptos", len(resultado.corruptos))
+        return resultado
+
+    def _desencriptar_lote(self, tokens):
+        """(ResultadoLote, nº de tokens que no estaban en caché)."""
+        apuestas, pendientes = {}, []
+        with self._lock:
+            for token in dict.fromkeys(tokens):
+                apuesta = self._cache.get(token)
+                if apuesta is None: pendientes.append(token)
+                else:
+                    self._cache.move_to_end(token)
+                    apuestas[token] = apuesta
+        corruptos = []
+        if pendientes:
+            if len(pendientes) >= self.umbral_paralelo and self.hilos > 1:
+                tam = -(-len(pendientes) // self.hilos)
+                trozos = [pendientes[i:i + tam] for i in range(0, len(pendientes), tam)]
+                with ThreadPoolExecutor(max_workers=self.hilos) as pool:
+                    partes = list(pool.map(self._descifrar_trozo, trozos))
+            else:
+                partes = [self._descifrar_trozo(pendientes)]
+            for ok, malos in partes:
+                self._guardar_cache(ok)
+                apuestas.update(ok)
+                corruptos.extend(malos)
+        return ResultadoLote(apuestas, corruptos), len(pendientes)
@@ -0,0 +1,238 @@
+"""Cliente de Google Sheets compartido por todo el proceso.
+
+Autorizar la cuenta de servicio, abrir el libro y pedir los metadatos de cada
+pestaña cuesta varias llamadas HTTP. Aquí se hace una sola vez por proceso y se
+reutilizan los manejadores `Spreadsheet`/`Worksheet` entre sesiones. Si un
+manejador queda obsoleto (token revocado, pestaña renombrada o recreada) se
+reconecta y se repite la operación una vez.
+
+Cada petición HTTP pasa además por un `Planificador`: un cubo de tokens con la
+cuota por minuto configurada y reintentos con espera exponencial aleatorizada
+ante 429/5xx. `UnVuelo` agrupa lecturas idénticas simultáneas en una sola.
+Cada petición queda medida en `metricas` (sheets_peticion, por operación).
+"""
+import random
+import threading
+import time
+
+from metricas import contar, observar, tramo
+
+try:
+    from google.auth.exceptions import GoogleAuthError
+    from gspread.exceptions import GSpreadException
+    from requests.exceptions import RequestException
+    # Fallos de red, de la API o de credenciales al hablar con Sheets
+    ERRORES_SHEETS = (GSpreadException, RequestException, GoogleAuthError)
+except ImportError:          # sin gspread solo queda el motor SQLite
+    ERRORES_SHEETS = ()
+
+SCOPE = ['https://spreadsheets.google.com/feeds', 'https://www.googleapis.com/auth/drive']
+
+# Códigos HTTP que indican credenciales o manejadores caducados
+_ESTADOS_RECONEXION = (401, 404)
+
+# Códigos HTTP que merece la pena reintentar (cuota y errores transitorios del servidor)
+_ESTADOS_REINTENTO = (429, 500, 502, 503, 504)
+
+# Sufijos de la API de valores que identifican la operación de una petición
+_ACCIONES = (":append", ":batchGet", ":batchUpdate", ":batchClear", ":clear")
+
+
+def _operacion(method, endpoint):
+    """Etiqueta de la petición para las métricas: 'GET batchGet', 'POST append'..."""
+    ruta = str(endpoint).split("?")[0]
+    accion = next((a[1:] for a in _ACCIONES if ruta.endswith(a)), None)
+    if accion is None:
+        if "/drive/" in ruta: accion = "drive"
+        elif "/values/" in ruta: accion = "values"
+        else: accion = "metadatos"
+    return f"{method.upper()} {accion}"
+
+
+class CuboTokens:
+    """Limita el ritmo de peticiones a `por_minuto`, con ráfagas de hasta `capacidad`."""
+
+    def __init__(self, por_minuto=60, capacidad=None):
+        self.ritmo = por_minuto / 60.0
+        self.capacidad = capacidad or max(1, por_minuto // 6)
+        self._tokens = float(self.capacidad)
+        self._ultimo = time.monotonic()
+        self._lock = threading.Lock()
+
+    def tomar(self):
+        """Bloquea hasta que haya un token disponible."""
+        esperado = 0.0
+        while True:
+            with self._lock:
+                ahora = time.monotonic()
+                self._tokens = min(self.capacidad, self._tokens + (ahora - self._ultimo) * self.ritmo)
+                self._ultimo = ahora
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    break
+                espera = (1 - self._tokens) / self.ritmo
+            time.sleep(espera)
+            esperado += espera
+        if esperado: observar("sheets_espera_cuota", esperado)
+
+
+class Planificador:
+    """Ejecuta peticiones respetando la cuota y reintentando las que fallan por cuota o 5xx."""
+
+    def __init__(self, por_minuto=60, intentos=6, espera_base=1.0, espera_maxima=32.0):
+        self.cubo = CuboTokens(por_minuto)
+        self.intentos = intentos
+        self.espera_base = espera_base
+        self.espera_maxima = espera_maxima
+
+    def _reintentable(self, error, idempotente):
+        codigo = getattr(error, "code", None)
+        if codigo == 429: return True                 # la petición no llegó a aplicarse
+        return idempotente and (codigo in _ESTADOS_REINTENTO or codigo is None)
+
+    def ejecutar(self, peticion, idempotente=True):
+        from gspread.exceptions import APIError
+        from requests.exceptions import ConnectionError, Timeout
+        for intento in range(self.intentos):
+            self.cubo.tomar()
+            try:
+                return peticion()
+            except (APIError, ConnectionError, Timeout) as e:
+                if intento == self.intentos - 1 or not self._reintentable(e, idempotente): raise
+                contar("sheets_reintentos", codigo=getattr(e, "code", None) or type(e).__name__)
+            espera = min(self.espera_maxima, self.espera_base * 2 ** intento)
+            time.sleep(espera * random.uniform(0.5, 1.5))
+
+
+class UnVuelo:
+    """Single-flight: llamadas simultáneas con la misma clave comparten una sola ejecución."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._en_curso = {}
+
+    def hacer(self, clave, funcion):
+        with self._lock:
+            vuelo = self._en_curso.get(clave)
+            lider = vuelo is None
+            if lider:
+                vuelo = self._en_curso[clave] = {"hecho": threading.Event()}
+        if not lider:
+            vuelo["hecho"].wait()
+            if "error" in vuelo: raise vuelo["error"]
+            return vuelo["resultado"]
+        try:
+            vuelo["resultado"] = funcion()
+            return vuelo["resultado"]
+        except Exception as e:
+            vuelo["error"] = e
+            raise
+        finally:
+            with self._lock: del self._en_curso[clave]
+            vuelo["hecho"].set()
+
+
+class ClienteSheets:
+    """Cliente gspread autorizado con caché de libro y pestañas."""
+
+    # Reautorización preventiva: el token de Google dura 1 h
+    VIDA_MAXIMA = 50 * 60
+
+    def __init__(self, creds_dict, nombre_libro, cuota_por_minuto=60):
+        self.creds_dict = creds_dict
+        self.nombre_libro = nombre_libro
+        self.planificador = Planificador(cuota_por_minuto)
+        self._lock = threading.RLock()
+        self._client = None
+        self._libro = None
+        self._hojas = {}
+        self._autorizado_en = 0.0
+
+    def _autorizar(self):
+        import gspread
+        from oauth2client.service_account import ServiceAccountCredentials
+        creds = ServiceAccountCredentials.from_json_keyfile_dict(self.creds_dict, SCOPE)
+        self._client = gspread.authorize(creds)
+        self._planificar(self._client.http_client)
+        self._autorizado_en = time.monotonic()
+        self._libro = None
+        self._hojas.clear()
+
+    def _planificar(self, http):
+        """Hace pasar cada petición HTTP de gspread por el planificador."""
+        original = http.request
+        def request(method, endpoint, *args, **kwargs):
+            # Un append repetido tras un 5xx podría duplicar filas: solo se reintenta si es 429
+            idempotente = method.lower() == "get" or ":append" not in str(endpoint)
+            with tramo("sheets_peticion", operacion=_operacion(method, endpoint)):
+                return self.planificador.ejecutar(lambda: original(method, endpoint, *args, **kwargs), idempotente)
+        http.request = request
+
+    def _refrescar_token(self):
+        """Renueva el token si ha caducado (AuthorizedSession también lo hace al recibir un 401)."""
+        http = getattr(self._client, "http_client", None)
+        auth = getattr(http, "auth", None)
+        if auth is not None and getattr(auth, "expired", False):
+            http.login()
+
+    def libro(self):
+        with self._lock:
+            if self._client is None or time.monotonic() - self._autorizado_en > self.VIDA_MAXIMA:
+                with tramo("sheets_conectar", paso="autorizar"):
+                    self._autorizar()
+            else:
+                self._refrescar_token()
+            if self._libro is None:
+                with tramo("sheets_conectar", paso="abrir_libro"):
+                    self._libro = self._client.open(self.nombre_libro)
+            return self._libro
+
+    def hoja(self, nombre):
+        with self._lock:
+            ws = self._hojas.get(nombre)
+            if ws is None:
+                contar("sheets_pestanas_abiertas", hoja=nombre)
+                ws = self.libro().worksheet(nombre)
+                self._hojas[nombre] = ws
+            return ws
+
+    def invalidar(self, reautorizar=False):
+        """Descarta los manejadores cacheados (y el cliente si reautorizar)."""
+        with self._lock:
+            self._libro = None
+            self._hojas.clear()
+            if reautorizar: self._client = None
+
+    def _reconectando(self, obtener, operacion):
+        from gspread.exceptions import APIError, WorksheetNotFound
+        try:
+            return operacion(obtener())
+        except WorksheetNotFound:
+            self.invalidar()
+        except APIError as e:
+            codigo = getattr(e, "code", None)
+            if codigo not in _ESTADOS_RECONEXION: raise
+            self.invalidar(reautorizar=codigo == 401)
+        return operacion(obtener())
+
+    def ejecutar(self, nombre, operacion):
+        """Ejecuta operacion(ws) sobre la pestaña, reconectando una vez si el manejador está obsoleto."""
+        return self._reconectando(lambda: self.hoja(nombre), operacion)
+
+    def en_libro(self, operacion):
+        """Como ejecutar, pero operacion(libro): para llamadas que abarcan varias pestañas."""
+        return self._reconectando(self.libro, operacion)
+
+
+_POOL = {}
+_POOL_LOCK = threading.Lock()
+
+
+def obtener_cliente(creds_dict, nombre_libro, cuota_por_minuto=60):
+    """Devuelve el cliente único del proceso para (cuenta de servicio, libro)."""
+    clave = (creds_dict.get("client_email"), nombre_libro)
+    with _POOL_LOCK:
+        cliente = _POOL.get(clave)
+        if cliente is None:
+            cliente = _POOL[clave] = ClienteSheets(dict(creds_dict), nombre_libro, cuota_por_minuto)
+        return cliente
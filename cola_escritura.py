@@ -0,0 +1,152 @@
+"""Cola de escritura diferida (write-behind) para las apuestas.
+
+`guardar_apuesta` ya no espera a Google Sheets: la apuesta se registra en un
+diario local (SQLite, confirmado en disco) y se responde al usuario. Un hilo en
+segundo plano agrupa lo pendiente y lo vuelca con un `batch_update` +
+`append_rows` por hoja.
+
+Garantías:
+  * La fecha de la apuesta es la del momento en que se encola, no la del volcado:
+    una apuesta hecha antes de `fecha_limite` sigue siéndolo aunque se vuelque después.
+  * Nada se borra del diario hasta que el almacén confirma la escritura. Si el
+    proceso muere a medias, se repite al arrancar (el upsert es idempotente).
+  * Para una misma (hoja, usuario, evento) gana siempre la última encolada
+    (orden por número de secuencia, nunca por hora de volcado).
+"""
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS pendientes (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    hoja TEXT, usuario TEXT, id_evento TEXT, fecha TEXT, datos TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_pendientes_clave ON pendientes (hoja, usuario, id_evento);
+CREATE TABLE IF NOT EXISTS cerrojo (
+    id INTEGER PRIMARY KEY CHECK (id = 1), dueno TEXT, hasta REAL
+);
+INSERT OR IGNORE INTO cerrojo VALUES (1, '', 0);
+"""
+
+
+class ColaEscrituras:
+    """Diario local de apuestas pendientes y su volcador en segundo plano.
+
+    Varios procesos pueden compartir el mismo fichero: un cerrojo con caducidad
+    en la propia base garantiza que solo uno vuelca a la vez. Mientras dura un
+    volcado se renueva, porque los reintentos del cliente pueden pasar de
+    duracion_cerrojo.
+    """
+
+    def __init__(self, almacen, ruta="cola_apuestas.db", intervalo=2.0, tam_lote=500,
+                 al_volcar=None, duracion_cerrojo=60.0):
+        self.almacen = almacen
+        self.ruta = ruta
+        self.intervalo = intervalo
+        self.tam_lote = tam_lote
+        self.al_volcar = al_volcar
+        self.duracion_cerrojo = duracion_cerrojo
+        self._id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._lock = threading.Lock()
+        self._con = sqlite3.connect(ruta, check_same_thread=False, timeout=10)
+        if ruta != ":memory:":
+            self._con.execute("PRAGMA journal_mode=WAL")
+        self._con.execute("PRAGMA synchronous=FULL")
+        self._con.executescript(_ESQUEMA)
+        self._parar = threading.Event()
+        self._hilo = None
+
+    # --- ENCOLAR Y CONSULTAR ---
+    def encolar(self, hoja, usuario, id_evento, fecha, datos):
+        """Registra la apuesta en disco y devuelve su número de secuencia."""
+        with self._lock, self._con:
+            cur = self._con.execute(
+                "INSERT INTO pendientes (hoja, usuario, id_evento, fecha, datos) VALUES (?, ?, ?, ?, ?)",
+                (hoja, usuario, id_evento, fecha, datos))
+            return cur.lastrowid
+
+    def pendiente(self, hoja, usuario, id_evento):
+        """Última apuesta aún no volcada de (hoja, usuario, evento), o None."""
+        with self._lock:
+            fila = self._con.execute(
+                "SELECT datos FROM pendientes WHERE hoja = ? AND usuario = ? AND id_evento = ? "
+                "ORDER BY seq DESC LIMIT 1", (hoja, usuario, id_evento)).fetchone()
+        return fila[0] if fila else None
+
+    def num_pendientes(self):
+        with self._lock:
+            return self._con.execute("SELECT COUNT(*) FROM pendientes").fetchone()[0]
+
+    # --- VOLCADO ---
+    def _tomar_cerrojo(self):
+        ahora = time.time()
+        with self._lock, self._con:
+            cur = self._con.execute(
+                "UPDATE cerrojo SET dueno = ?, hasta = ? WHERE id = 1 AND (hasta < ? OR dueno = ?)",
+                (self._id, ahora + self.duracion_cerrojo, ahora, self._id))
+            return cur.rowcount == 1
+
+    def _renovar_cerrojo(self):
+        with self._lock, self._con:
+            self._con.execute("UPDATE cerrojo SET hasta = ? WHERE id = 1 AND dueno = ?",
+                              (time.time() + self.duracion_cerrojo, self._id))
+
+    def _mantener_cerrojo(self, fin):
+        while not fin.wait(self.duracion_cerrojo / 3): self._renovar_cerrojo()
+
+    def _soltar_cerrojo(self):
+        with self._lock, self._con:
+            self._con.execute("UPDATE cerrojo SET hasta = 0 WHERE id = 1 AND dueno = ?", (self._id,))
+
+    def volcar(self):
+        """Vuelca un lote de pendientes al almacén. Devuelve cuántas apuestas se escribieron."""
+        if not self._tomar_cerrojo(): return 0
+        fin, latido = threading.Event(), None
+        try:
+            with self._lock:
+                filas = self._con.execute(
+                    "SELECT seq, hoja, usuario, id_evento, fecha, datos FROM pendientes ORDER BY seq LIMIT ?",
+                    (self.tam_lote,)).fetchall()
+            if not filas: return 0
+            latido = threading.Thread(target=self._mantener_cerrojo, args=(fin,), name="cerrojo-apuestas", daemon=True)
+            latido.start()
+            # Fusiona por clave: la última encolada gana, en el orden de su primera aparición
+            por_hoja = {}
+            for seq, hoja, usuario, id_evento, fecha, datos in filas:
+                por_hoja.setdefault(hoja, {})[(usuario, id_evento)] = (usuario, id_evento, fecha, datos)
+            for hoja, apuestas in por_hoja.items():
+                self.almacen.guardar_apuestas_lote(hoja, list(apuestas.values()))
+            with self._lock, self._con:
+                self._con.execute("DELETE FROM pendientes WHERE seq <= ?", (filas[-1][0],))
+            if self.al_volcar: self.al_volcar()
+            return sum(len(a) for a in por_hoja.values())
+        finally:
+            fin.set()
+            if latido is not None: latido.join()     # que no renueve después de soltarlo
+            self._soltar_cerrojo()
+
+    def _bucle(self):
+        espera = self.intervalo
+        while not self._parar.wait(espera):
+            try:
+                while self.volcar() and not self._parar.is_set(): pass
+                espera = self.intervalo
+            except Exception as e:
+                print(f"Error volcando apuestas (se reintentará): {e}")
+                espera = min(espera * 2, 60)
+
+    def iniciar(self):
+        if self._hilo is None or not self._hilo.is_alive():
+            self._parar.clear()
+            self._hilo = threading.Thread(target=self._bucle, name="volcador-apuestas", daemon=True)
+            self._hilo.start()
+        return self
+
+    def detener(self, volcar=True):
+        self._parar.set()
+        if self._hilo is not None: self._hilo.join()
+        if volcar:
+            while self.volcar(): pass
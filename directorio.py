@@ -0,0 +1,44 @@
+"""Directorio de usuarios y ligas, construido una vez por descarga de 'usuarios'.
+
+Las ligas se guardan como texto separado por comas en 'liga_privada'. Aquí se
+parsean una sola vez y se indexan: login, vista previa de liga y ranking por
+liga pasan a ser búsquedas en diccionarios.
+"""
+
+
+def parsear_ligas(texto):
+    """'oficina, Familia' -> ['OFICINA', 'FAMILIA']"""
+    return [l.strip().upper() for l in str(texto).split(",") if l.strip()]
+
+
+class DirectorioUsuarios:
+    """usuario -> ficha, liga -> miembros y el conjunto de ligas existentes."""
+
+    def __init__(self, df_users):
+        self.por_usuario = {}
+        self.miembros = {}
+        if df_users.empty: return
+        columnas = ['usuario', 'password', 'rol', 'liga_privada']
+        for usuario, password, rol, ligas_str in df_users[columnas].itertuples(index=False):
+            if usuario in self.por_usuario: continue   # manda la primera fila, como en la hoja
+            ligas = parsear_ligas(ligas_str)
+            self.por_usuario[usuario] = {"password": password, "rol": rol, "ligas": ligas}
+            for liga in ligas:
+                self.miembros.setdefault(liga, set()).add(usuario)
+
+    @property
+    def ligas(self):
+        return self.miembros.keys()
+
+    def existe(self, usuario):
+        return usuario in self.por_usuario
+
+    def miembros_de(self, liga):
+        return self.miembros.get(liga, set())
+
+    def login(self, usuario, password):
+        """(es_valido, rol, ligas) con la misma semántica que verificar_login."""
+        ficha = self.por_usuario.get(usuario)
+        if ficha is None or str(password) != ficha["password"]: return False, None, []
+        if ficha["rol"] == "pendiente": return False, "pendiente", []
+        return True, ficha["rol"], list(ficha["ligas"])
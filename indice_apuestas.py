@@ -0,0 +1,25 @@
+"""Índice de la última apuesta de cada usuario, construido una vez por instantánea.
+
+La pestaña "Hacer Porra" solo necesita el último token de (usuario, evento).
+En vez de filtrar las hojas de apuestas enteras en cada rerun, se agrupan aquí
+una vez y la consulta pasa a ser una búsqueda en diccionarios.
+"""
+from almacenamiento import COLUMNA_EVENTO, HOJA_CARRERA, HOJA_MUNDIAL
+
+
+class IndiceApuestas:
+    """usuario -> {(hoja, evento): último datos_encriptados}, en el orden de la hoja."""
+
+    def __init__(self, df_bets_c, df_bets_m):
+        self.por_usuario = {}
+        for hoja, df in ((HOJA_CARRERA, df_bets_c), (HOJA_MUNDIAL, df_bets_m)):
+            col = COLUMNA_EVENTO[hoja]
+            if df.empty or col not in df.columns: continue
+            ultimas = df.drop_duplicates(['usuario', col], keep='last')   # manda la última fila
+            for usuario, evento, datos in zip(ultimas['usuario'].tolist(), ultimas[col].tolist(),
+                                              ultimas['datos_encriptados'].tolist()):
+                self.por_usuario.setdefault(usuario, {})[(hoja, evento)] = datos
+
+    def ultima(self, hoja, usuario, id_evento):
+        """Último texto encriptado de (usuario, evento) en hoja, o None."""
+        return self.por_usuario.get(usuario, {}).get((hoja, id_evento))
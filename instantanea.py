@@ -0,0 +1,166 @@
+"""Instantáneas en disco de las hojas ya descargadas, compartidas entre procesos.
+
+Cada grupo de hojas ('maestros', 'resultados') se guarda como ficheros Arrow IPC
+(columnar, sin pickle) más un manifiesto JSON con versión de formato, hora y
+época del calendario. El manifiesto se sustituye de forma atómica, así que un
+lector nunca ve un grupo a medio escribir.
+
+`CacheDisco.obtener` sigue la pauta stale-while-revalidate: si la copia en disco
+está fresca se devuelve; si está caducada se devuelve igualmente y se refresca en
+segundo plano (un solo proceso a la vez); si no existe, se descarga en el momento.
+No se publica ninguna descarga que empezara antes del último `invalidar` (de
+cualquier proceso).
+"""
+import json
+import os
+import threading
+import time
+import uuid
+
+from metricas import contar
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+except ImportError:          # sin pyarrow la caché en disco se desactiva
+    pa = None
+
+FORMATO = 1
+
+# Un refresco que tarde más que esto se da por muerto y otro proceso puede reintentarlo
+_CADUCIDAD_CERROJO = 120
+
+
+class CacheDisco:
+    def __init__(self, directorio=".cache_porra"):
+        self.directorio = directorio
+        self.activa = pa is not None
+        self._refrescando = set()
+        self._lock = threading.Lock()
+        if self.activa: os.makedirs(directorio, exist_ok=True)
+
+    def _ruta(self, nombre):
+        return os.path.join(self.directorio, nombre)
+
+    # --- LECTURA / ESCRITURA ---
+    def leer(self, nombre):
+        """(tablas {hoja: DataFrame}, manifiesto) o (None, None) si no hay copia válida."""
+        if not self.activa: return None, None
+        try:
+            with open(self._ruta(f"{nombre}.json")) as f:
+                manifiesto = json.load(f)
+            if manifiesto.get("formato") != FORMATO: return None, None
+            tablas = {}
+            for hoja, fichero in manifiesto["ficheros"].items():
+                with pa.memory_map(self._ruta(fichero)) as fuente:
+                    tablas[hoja] = ipc.open_file(fuente).read_all().to_pandas()
+            return tablas, manifiesto
+        except (OSError, ValueError, KeyError, pa.ArrowException):
+            return None, None
+
+    def escribir(self, nombre, tablas, epoca=None, generacion=None):
+        """Publica el grupo. Con generacion, no publica si invalidar() la avanzó entretanto."""
+        if not self.activa: return
+        version = uuid.uuid4().hex[:12]
+        ficheros = {}
+        for hoja, df in tablas.items():
+            fichero = f"{nombre}.{hoja}.{version}.arrow"
+            tabla = pa.Table.from_pandas(df.astype(str) if not df.empty else df, preserve_index=False)
+            with pa.OSFile(self._ruta(fichero), "wb") as destino:
+                with ipc.new_file(destino, tabla.schema) as escritor:
+                    escritor.write_table(tabla)
+            ficheros[hoja] = fichero
+        manifiesto = {"formato": FORMATO, "version": version, "momento": time.time(),
+                      "epoca": epoca, "ficheros": ficheros}
+        temporal = self._ruta(f"{nombre}.json.{version}")
+        with open(temporal, "w") as f:
+            json.dump(manifiesto, f)
+        if generacion is not None and self._generacion(nombre) != generacion:
+            os.remove(temporal)
+            return
+        os.replace(temporal, self._ruta(f"{nombre}.json"))
+        # invalidar() pudo colarse entre la comprobación y el reemplazo
+        if generacion is not None and self._generacion(nombre) != generacion: self._quitar_manifiesto(nombre)
+        self._limpiar(nombre, set(ficheros.values()))
+
+    def _limpiar(self, nombre, vigentes):
+        """Borra versiones antiguas (con margen, por si alguien aún las está leyendo)."""
+        ahora = time.time()
+        for fichero in os.listdir(self.directorio):
+            if fichero.startswith(f"{nombre}.") and fichero.endswith(".arrow") and fichero not in vigentes:
+                ruta = self._ruta(fichero)
+                try:
+                    if ahora - os.path.getmtime(ruta) > 60: os.remove(ruta)
+                except OSError: pass
+
+    def _generacion(self, nombre):
+        try:
+            with open(self._ruta(f"{nombre}.generacion")) as f: return f.read()
+        except OSError: return ""
+
+    def _quitar_manifiesto(self, nombre):
+        try: os.remove(self._ruta(f"{nombre}.json"))
+        except OSError: pass
+
+    def invalidar(self, nombre):
+        """Tras una escritura propia: la próxima lectura debe ir a la fuente y los
+        refrescos ya en marcha, de cualquier proceso, no deben publicar."""
+        if self.activa:
+            version = uuid.uuid4().hex[:12]
+            temporal = self._ruta(f"{nombre}.generacion.{version}")
+            try:
+                with open(temporal, "w") as f: f.write(version)
+                os.replace(temporal, self._ruta(f"{nombre}.generacion"))
+            except OSError: pass
+        self._quitar_manifiesto(nombre)
+
+    # --- STALE-WHILE-REVALIDATE ---
+    def _tomar_cerrojo(self, nombre):
+        ruta = self._ruta(f"{nombre}.lock")
+        try:
+            if time.time() - os.path.getmtime(ruta) > _CADUCIDAD_CERROJO: os.remove(ruta)
+        except OSError: pass
+        try:
+            os.close(os.open(ruta, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            return True
+        except OSError:
+            return False
+
+    def _refrescar(self, nombre, descargar, epoca, generacion):
+        try:
+            self.escribir(nombre, descargar(), epoca, generacion)
+        except Exception as e:
+            print(f"Error refrescando instantánea {nombre}: {e}")
+        finally:
+            try: os.remove(self._ruta(f"{nombre}.lock"))
+            except OSError: pass
+            with self._lock: self._refrescando.discard(nombre)
+
+    def refrescar_en_segundo_plano(self, nombre, descargar, epoca=None):
+        with self._lock:
+            if nombre in self._refrescando: return
+            if not self._tomar_cerrojo(nombre): return
+            self._refrescando.add(nombre)
+        generacion = self._generacion(nombre)
+        threading.Thread(target=self._refrescar, args=(nombre, descargar, epoca, generacion),
+                         name=f"refresco-{nombre}", daemon=True).start()
+
+    def obtener(self, nombre, descargar, max_edad, epoca=None):
+        """Tablas del grupo. descargar() -> {hoja: DataFrame} va a la fuente."""
+        tablas, manifiesto = self.leer(nombre)
+        if tablas is not None and manifiesto.get("epoca") == epoca:
+            caducada = time.time() - manifiesto["momento"] > max_edad
+            contar("instantanea", grupo=nombre, resultado="caducada" if caducada else "fresca")
+            if caducada: self.refrescar_en_segundo_plano(nombre, descargar, epoca)
+            return tablas
+        contar("instantanea", grupo=nombre, resultado="descarga")
+        generacion = self._generacion(nombre)
+        try:
+            nuevas = descargar()
+        except Exception:
+            if tablas is None: raise
+            return tablas      # la fuente falla: mejor la última copia (de otra época) que nada
+        tablas = nuevas
+        try: self.escribir(nombre, tablas, epoca, generacion)
+        except (OSError, ValueError) as e: print(f"No se pudo guardar la instantánea {nombre}: {e}")
+        return tablas
@@ -0,0 +1,190 @@
+"""Métricas en proceso: contadores e histogramas de duración.
+
+Sin dependencias (ni Streamlit): las usan el cliente de Sheets, el descifrador,
+el motor de puntuación y la app. Todo se agrega en memoria en `METRICAS`, que
+se puede consultar como tabla (`resumen`) o exportar en el formato de texto de
+Prometheus (`exportar_texto`) para que lo lea un recolector local.
+
+    with tramo("sheets_peticion", operacion="batchGet"):
+        ...
+    contar("cache_fallos", cache="maestros")
+"""
+import functools
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+PREFIJO = "porra"
+
+# Límites superiores (s) de los cubos de los histogramas
+CUBOS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histograma:
+    def __init__(self):
+        self.cubos = [0] * (len(CUBOS) + 1)     # el último es +Inf
+        self.cuenta = 0
+        self.suma = 0.0
+        self.maximo = 0.0
+
+    def observar(self, segundos):
+        self.cubos[bisect_left(CUBOS, segundos)] += 1
+        self.cuenta += 1
+        self.suma += segundos
+        self.maximo = max(self.maximo, segundos)
+
+    def percentil(self, p):
+        """Aproximado: límite superior del cubo donde cae el percentil p (0-100)."""
+        if not self.cuenta: return 0.0
+        objetivo, acumulado = self.cuenta * p / 100, 0
+        for i, n in enumerate(self.cubos):
+            acumulado += n
+            if acumulado >= objetivo: return min(CUBOS[i], self.maximo) if i < len(CUBOS) else self.maximo
+        return self.maximo
+
+
+def _clave(nombre, etiquetas):
+    return nombre, tuple(sorted((k, str(v)) for k, v in etiquetas.items()))
+
+
+def _etiquetas_texto(etiquetas, extra=()):
+    pares = list(etiquetas) + list(extra)
+    if not pares: return ""
+    return "{" + ",".join(f'{k}="{str(v)}"'.replace("\n", " ") for k, v in pares) + "}"
+
+
+class Metricas:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._contadores = {}     # (nombre, etiquetas) -> n
+        self._histogramas = {}    # (nombre, etiquetas) -> Histograma
+        self.desde = time.time()
+
+    def contar(self, nombre, n=1, **etiquetas):
+        clave = _clave(nombre, etiquetas)
+        with self._lock:
+            self._contadores[clave] = self._contadores.get(clave, 0) + n
+
+    def observar(self, nombre, segundos, **etiquetas):
+        clave = _clave(nombre, etiquetas)
+        with self._lock:
+            histograma = self._histogramas.get(clave)
+            if histograma is None: histograma = self._histogramas[clave] = Histograma()
+            histograma.observar(segundos)
+
+    @contextmanager
+    def tramo(self, nombre, **etiquetas):
+        """Mide la duración del bloque, acabe como acabe."""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(nombre, time.perf_counter() - inicio, **etiquetas)
+
+    def reiniciar(self):
+        with self._lock:
+            self._contadores.clear()
+            self._histogramas.clear()
+            self.desde = time.time()
+
+    # --- CONSULTA Y EXPORTACIÓN ---
+    def contadores(self):
+        """[{"Métrica", "Etiquetas", "Total"}] ordenado por nombre."""
+        with self._lock:
+            items = sorted(self._contadores.items())
+        return [{"Métrica": n, "Etiquetas": ", ".join(f"{k}={v}" for k, v in e), "Total": total}
+                for (n, e), total in items]
+
+    def aciertos_cache(self):
+        """[{"Caché", "Llamadas", "Fallos", "Aciertos %"}] a partir de los contadores de medir_cache."""
+        with self._lock:
+            llamadas = {dict(e).get("cache"): n for (m, e), n in self._contadores.items() if m == "cache_llamadas"}
+            fallos = {dict(e).get("cache"): n for (m, e), n in self._contadores.items() if m == "cache_fallos"}
+        return [{"Caché": c, "Llamadas": n, "Fallos": fallos.get(c, 0),
+                 "Aciertos %": round(100 * (n - fallos.get(c, 0)) / n, 1) if n else 0.0}
+                for c, n in sorted(llamadas.items())]
+
+    def resumen(self):
+        """Una fila por histograma con cuenta, media, p50, p95 y máximo en ms."""
+        with self._lock:
+            items = sorted(self._histogramas.items())
+            filas = []
+            for (n, e), h in items:
+                filas.append({"Métrica": n, "Etiquetas": ", ".join(f"{k}={v}" for k, v in e),
+                              "Llamadas": h.cuenta, "Total s": round(h.suma, 3),
+                              "Media ms": round(h.suma / h.cuenta * 1000, 2) if h.cuenta else 0.0,
+                              "p50 ms": round(h.percentil(50) * 1000, 2),
+                              "p95 ms": round(h.percentil(95) * 1000, 2),
+                              "Máx ms": round(h.maximo * 1000, 2)})
+        return filas
+
+    def exportar_texto(self):
+        """Formato de exposición de texto de Prometheus."""
+        lineas = []
+        with self._lock:
+            contadores = sorted(self._contadores.items())
+            histogramas = sorted((c, list(h.cubos), h.suma, h.cuenta) for c, h in self._histogramas.items())
+        vistos = set()
+        for (nombre, etiquetas), total in contadores:
+            metrica = f"{PREFIJO}_{nombre}_total"
+            if metrica not in vistos:
+                lineas.append(f"# TYPE {metrica} counter")
+                vistos.add(metrica)
+            lineas.append(f"{metrica}{_etiquetas_texto(etiquetas)} {total}")
+        for (nombre, etiquetas), cubos, suma, cuenta in histogramas:
+            metrica = f"{PREFIJO}_{nombre}_seconds"
+            if metrica not in vistos:
+                lineas.append(f"# TYPE {metrica} histogram")
+                vistos.add(metrica)
+            acumulado = 0
+            for limite, n in zip(list(CUBOS) + ["+Inf"], cubos):
+                acumulado += n
+                lineas.append(f"{metrica}_bucket{_etiquetas_texto(etiquetas, [('le', limite)])} {acumulado}")
+            lineas.append(f"{metrica}_sum{_etiquetas_texto(etiquetas)} {suma:.6f}")
+            lineas.append(f"{metrica}_count{_etiquetas_texto(etiquetas)} {cuenta}")
+        return "\n".join(lineas) + "\n"
+
+    def volcar_fichero(self, ruta):
+        """Escribe exportar_texto() en ruta de forma atómica (para un recolector de ficheros)."""
+        temporal = f"{ruta}.{os.getpid()}.tmp"
+        with open(temporal, "w") as f:
+            f.write(self.exportar_texto())
+        os.replace(temporal, ruta)
+
+    def exportar_periodicamente(self, ruta, intervalo=15.0):
+        """Hilo en segundo plano que vuelca las métricas a ruta cada intervalo segundos."""
+        def bucle():
+            while True:
+                try: self.volcar_fichero(ruta)
+                except OSError as e: print(f"No se pudieron exportar las métricas a {ruta}: {e}")
+                time.sleep(intervalo)
+        hilo = threading.Thread(target=bucle, name="exportador-metricas", daemon=True)
+        hilo.start()
+        return hilo
+
+
+# Registro único del proceso
+METRICAS = Metricas()
+contar = METRICAS.contar
+observar = METRICAS.observar
+tramo = METRICAS.tramo
+
+
+def medir_cache(nombre):
+    """Decorador para poner por fuera de st.cache_data/st.cache_resource.
+
+    Cuenta las llamadas y mide lo que tardan; la función cacheada cuenta sus
+    fallos con contar("cache_fallos", cache=nombre), ya que solo se ejecuta
+    cuando no hay copia. Conserva .clear().
+    """
+    def decorar(funcion):
+        @functools.wraps(funcion)
+        def envoltura(*args, **kwargs):
+            contar("cache_llamadas", cache=nombre)
+            with tramo("cache_lectura", cache=nombre):
+                return funcion(*args, **kwargs)
+        envoltura.clear = funcion.clear
+        return envoltura
+    return decorar
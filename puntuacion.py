@@ -0,0 +1,361 @@
+"""Reglas de puntuación y motor de clasificación incremental.
+
+Sin dependencias de Streamlit: lo usan la app y cualquier proceso que necesite
+puntuar una temporada.
+"""
+import hashlib
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+import numpy as np
+import pandas as pd
+
+from almacenamiento import COLUMNA_EVENTO, HOJA_CARRERA, HOJA_MUNDIAL
+from apuestas import PILOTOS_2026
+from cifrado import Descifrador
+from metricas import contar, tramo
+
+ID_PILOTO = {p: i for i, p in enumerate(PILOTOS_2026)}
+
+
+def calcular_puntos_carrera(prediccion_lista, resultado_lista):
+    puntos = 0
+    for i, piloto in enumerate(prediccion_lista):
+        if i >= 10: break
+        try: pos_real = resultado_lista.index(piloto)
+        except: pos_real = -1
+        if pos_real == i: puntos += 4
+        elif i < 3 and pos_real < 3 and pos_real != -1: puntos += 2
+        elif pos_real < 10 and pos_real != -1: puntos += 1
+    return puntos
+
+
+def calcular_puntos_mundial(prediccion_lista, resultado_lista):
+    puntos = 0
+    for i, piloto in enumerate(prediccion_lista):
+        try:
+            pos_real = resultado_lista.index(piloto)
+            diferencia = abs(i - pos_real)
+            if diferencia == 0: puntos += 30
+            elif diferencia == 1: puntos += 10
+        except: pass
+    return puntos
+
+
+# --- PUNTUACIÓN VECTORIZADA (mismos puntos que las funciones de arriba) ---
+def _codificar(predicciones, resultado, ancho=None):
+    """Matriz (usuarios x posiciones) de ids de piloto y tabla id -> posición real.
+
+    Los nombres fuera de PILOTOS_2026 que aparezcan en el resultado reciben un id
+    extra; el resto de desconocidos y los huecos de relleno valen -1. La tabla
+    tiene una casilla final a -1, así que indexar con -1 da "no clasificado".
+    """
+    ids = ID_PILOTO
+    extra = [p for p in resultado if p not in ids]
+    if extra:
+        ids = dict(ids)
+        for p in extra: ids.setdefault(p, len(ids))
+    if ancho is None: ancho = max((len(p) for p in predicciones), default=0)
+    recortadas = [pred[:ancho] for pred in predicciones]
+    largos = np.fromiter((len(p) for p in recortadas), dtype=np.int64, count=len(recortadas))
+    planos = [p for pred in recortadas for p in pred]
+    filas = np.repeat(np.arange(len(recortadas)), largos)
+    columnas = np.arange(len(planos)) - np.repeat(np.cumsum(largos) - largos, largos)
+    matriz = np.full((len(predicciones), ancho), -1, dtype=np.int16)
+    matriz[filas, columnas] = np.fromiter(map(ids.get, planos, repeat(-1)), dtype=np.int16, count=len(planos))
+    pos_real = np.full(len(ids) + 1, -1, dtype=np.int16)
+    for k in range(len(resultado) - 1, -1, -1):   # al revés: gana la primera aparición (list.index)
+        pos_real[ids[resultado[k]]] = k
+    return matriz, pos_real
+
+
+def puntuar_carrera_lote(predicciones, resultado):
+    """Puntos de carrera de muchas predicciones a la vez (array de enteros)."""
+    matriz, pos_real = _codificar(predicciones, resultado, ancho=10)
+    pos = pos_real[matriz]
+    i = np.arange(matriz.shape[1])
+    clasificado = pos != -1
+    exacto = pos == i
+    podio = ~exacto & (i < 3) & (pos < 3) & clasificado
+    top10 = ~exacto & ~podio & (pos < 10) & clasificado
+    return (4 * exacto + 2 * podio + top10).sum(axis=1, dtype=np.int64)
+
+
+def puntuar_mundial_lote(predicciones, resultado):
+    """Puntos de mundial de muchas predicciones a la vez (array de enteros)."""
+    matriz, pos_real = _codificar(predicciones, resultado)
+    pos = pos_real[matriz]
+    diferencia = np.abs(np.arange(matriz.shape[1]) - pos)
+    clasificado = pos != -1
+    return (30 * (clasificado & (diferencia == 0)) + 10 * (clasificado & (diferencia == 1))).sum(axis=1, dtype=np.int64)
+
+
+def resultado_de_fila(row_res):
+    """Lista de pilotos p1..p22 no vacíos de una fila de resultados_oficiales."""
+    return [row_res[f'p{i}'] for i in range(1, 23) if f'p{i}' in row_res and row_res[f'p{i}']]
+
+
+class EventoPuntuado:
+    """Puntos de un resultado oficial ya calculados (solo lectura para la UI)."""
+
+    def __init__(self, carrera_id, es_mundial, res_oficial, huella, cerrado=True):
+        self.carrera_id = carrera_id
+        self.es_mundial = es_mundial
+        self.cerrado = cerrado
+        self.res_oficial = res_oficial
+        self.huella = huella
+        self.puntos = {}          # usuario -> puntos (solo eventos cerrados)
+        self.apuestas = {}        # usuario -> lista de pilotos descifrada
+        self.filas = []           # [{"Usuario", "Puntos"}] en orden de la hoja
+        self.corruptos = []       # usuarios cuya apuesta no se pudo descifrar
+        self._tabla = None
+        self._comparaciones = {}
+
+    # Las tablas de detalle se construyen la primera vez que alguien las abre y
+    # se reutilizan mientras el evento no cambie (el motor crea uno nuevo si cambia)
+    def tabla(self):
+        if self._tabla is None: self._tabla = pd.DataFrame(self.filas)
+        return self._tabla
+
+    def comparacion(self, usuario):
+        """Apuesta de usuario frente al resultado oficial, posición a posición."""
+        if usuario not in self._comparaciones:
+            apostada = self.apuestas.get(usuario, [])
+            real = self.res_oficial
+            en_resultado = set(real)
+            filas = []
+            for i in range(22 if self.es_mundial else 10):
+                p_apostado = apostada[i] if i < len(apostada) else "-"
+                p_real = real[i] if i < len(real) else "-"
+                icon = "❌"
+                if p_apostado == p_real: icon = "✅"
+                elif p_apostado in en_resultado: icon = "⚠️"
+                filas.append({"Pos": i + 1, "Apuesta": p_apostado, "Real": p_real, "Estado": icon})
+            self._comparaciones[usuario] = pd.DataFrame(filas)
+        return self._comparaciones[usuario]
+
+
+class HistorialClasificacion:
+    """Evolución de la clasificación ronda a ronda.
+
+    Parte de la matriz de puntos (usuario x evento cerrado) que mantiene el
+    motor; los acumulados y la posición tras cada ronda son operaciones sobre
+    esa matriz, sin volver a descifrar ni puntuar nada. Cada vista (global o
+    de una liga) se calcula la primera vez que se pide.
+    """
+
+    def __init__(self, matriz, etiquetas):
+        self.puntos = matriz.set_axis(etiquetas, axis=1)
+        self._vistas = {}
+
+    @property
+    def rondas(self):
+        return self.puntos.columns.tolist()
+
+    def de(self, clave="GLOBAL", miembros=None):
+        """(acumulado, posiciones): DataFrames usuario x ronda del grupo."""
+        if clave not in self._vistas:
+            puntos = self.puntos if miembros is None else self.puntos[self.puntos.index.isin(list(miembros))]
+            acumulado = puntos.cumsum(axis=1)
+            posiciones = acumulado.rank(axis=0, method="min", ascending=False).astype("int64")
+            self._vistas[clave] = (acumulado, posiciones)
+        return self._vistas[clave]
+
+    def movimientos(self, clave="GLOBAL", miembros=None):
+        """Posición actual y puestos ganados (+) o perdidos (-) en la última ronda."""
+        acumulado, posiciones = self.de(clave, miembros)
+        if posiciones.empty: return pd.DataFrame(columns=["Piloto", "Posición", "Puntos", "Movimiento"])
+        actual = posiciones.iloc[:, -1]
+        previa = posiciones.iloc[:, -2] if posiciones.shape[1] > 1 else actual
+        return (pd.DataFrame({"Piloto": posiciones.index, "Posición": actual.values,
+                              "Puntos": acumulado.iloc[:, -1].values, "Movimiento": (previa - actual).values})
+                .sort_values(["Posición", "Piloto"], kind="stable").reset_index(drop=True))
+
+
+class Clasificacion:
+    """Foto de la clasificación tras una actualización del motor.
+
+    Guarda el ranking ya ordenado y un resumen por evento, de modo que pintar la
+    pestaña cuesta lo mismo a principio que a final de temporada.
+    """
+
+    def __init__(self, eventos, ranking, matriz=None):
+        self.eventos = eventos
+        self.por_id = {ev.carrera_id: ev for ev in eventos}
+        self.corruptos = sum(len(ev.corruptos) for ev in eventos)
+        self.ranking = (pd.DataFrame(list(ranking.items()), columns=["Piloto", "Puntos"])
+                        .sort_values("Puntos", ascending=False, kind="stable").reset_index(drop=True))
+        self.resumen = pd.DataFrame([{
+            "Evento": ev.carrera_id,
+            "Apuestas": len(ev.filas),
+            "Mejor": max(ev.puntos, key=ev.puntos.get) if ev.puntos else "-",
+            "Puntos": max(ev.puntos.values()) if ev.puntos else None,
+        } for ev in reversed(eventos)])      # lo más reciente primero
+        if eventos: self.resumen["Puntos"] = self.resumen["Puntos"].astype("Int64")
+        # Las columnas de la matriz del motor son los eventos cerrados, en orden de la hoja
+        if matriz is None: matriz = _matriz_vacia()
+        self.historial = HistorialClasificacion(matriz, [ev.carrera_id for ev in eventos if ev.cerrado])
+
+    def ranking_de(self, miembros=None):
+        """Ranking global, o solo de los usuarios en miembros (ya ordenado)."""
+        if miembros is None: return self.ranking
+        return self.ranking[self.ranking["Piloto"].isin(miembros)].reset_index(drop=True)
+
+
+def _matriz_vacia():
+    return pd.DataFrame(index=pd.Index([], dtype=object), dtype="int64")
+
+
+def _huella(res_oficial, cerrado, filas):
+    return hashlib.sha1(repr((res_oficial, cerrado, filas)).encode()).hexdigest()
+
+
+def resultados_vigentes(df_res):
+    """Una fila por evento con resultado: si un evento tiene varias (correcciones
+    añadidas con el append de antes), manda la última, en el sitio de la primera."""
+    if df_res.empty: return df_res
+    validas = df_res[df_res['p1'].astype(str) != ""]
+    if not validas['carrera'].duplicated().any(): return validas
+    ultimas = validas.drop_duplicates('carrera', keep='last').set_index('carrera', drop=False)
+    return ultimas.loc[validas['carrera'].drop_duplicates()].reset_index(drop=True)
+
+
+def _agrupar(df_bets, hoja):
+    if df_bets.empty: return {}
+    return dict(tuple(df_bets.groupby(COLUMNA_EVENTO[hoja], sort=False)))
+
+
+class MotorClasificacion:
+    """Clasificación materializada que solo recalcula los eventos que cambian.
+
+    Cada resultado vigente (ver resultados_vigentes) se guarda con una huella,
+    su estado (cerrado o no) y sus apuestas. Si la huella no cambia entre
+    llamadas, se reutilizan sus puntos sin descifrar nada.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._eventos = {}        # (posición, carrera) -> EventoPuntuado
+        self._totales = {}        # usuario -> puntos acumulados
+        self._aportes = {}        # usuario -> nº de eventos que suman a su total
+        self._matriz = _matriz_vacia()   # usuario x posición (en la hoja) de los eventos cerrados
+        self.recalculos = 0
+
+    def _sumar(self, evento, signo):
+        for user, pts in evento.puntos.items():
+            self._totales[user] = self._totales.get(user, 0) + signo * pts
+            self._aportes[user] = self._aportes.get(user, 0) + signo
+            if not self._aportes[user]:
+                del self._totales[user], self._aportes[user]
+
+    def _puntuar(self, carrera_id, res_oficial, filas, cerrado, huella, lote):
+        es_mundial = "mundial" in carrera_id
+        evento = EventoPuntuado(carrera_id, es_mundial, res_oficial, huella, cerrado)
+        if not cerrado:
+            evento.filas = [{"Usuario": user, "Puntos": "⏳"} for user, _ in filas]
+        else:
+            validas = [(user, lote.apuestas[datos]) for user, datos in filas if datos in lote.apuestas]
+            evento.corruptos = [user for user, datos in filas if datos not in lote.apuestas]
+            puntuar = puntuar_mundial_lote if es_mundial else puntuar_carrera_lote
+            puntos = puntuar([pred for _, pred in validas], res_oficial).tolist() if validas else []
+            for (user, pred_list), pts in zip(validas, puntos):
+                evento.apuestas[user] = pred_list
+                evento.puntos[user] = evento.puntos.get(user, 0) + pts
+                evento.filas.append({"Usuario": user, "Puntos": pts})
+        self.recalculos += 1
+        return evento
+
+    def _actualizar_matriz(self, vistos, cambiados):
+        """Sustituye solo las columnas de los eventos recalculados; el resto se conserva."""
+        columnas = [pos for pos, carrera_id in vistos if self._eventos[(pos, carrera_id)].cerrado]
+        nuevas = {pos: pd.Series(self._eventos[(pos, carrera_id)].puntos, dtype="int64")
+                  for pos, carrera_id in cambiados if pos in columnas}
+        matriz = self._matriz.drop(columns=[c for c in self._matriz.columns if c not in columnas or c in nuevas])
+        if nuevas: matriz = matriz.join(pd.DataFrame(nuevas), how="outer")
+        matriz = matriz.reindex(columns=columnas).fillna(0).astype("int64")
+        self._matriz = matriz[matriz.index.isin(list(self._totales))]   # mismos usuarios que el ranking
+
+    def actualizar(self, df_res, df_bets_c, df_bets_m, esta_cerrado, descifrador):
+        """Sincroniza con las hojas y devuelve (eventos en orden, ranking {usuario: puntos},
+        matriz de puntos usuario x evento cerrado) para construir una Clasificacion.
+
+        esta_cerrado(id_evento) -> bool; descifrador: un cifrado.Descifrador.
+        Las apuestas de todos los eventos que cambian se descifran en un solo lote.
+        """
+        with self._lock, tramo("puntuacion"):
+            grupos = {HOJA_CARRERA: _agrupar(df_bets_c, HOJA_CARRERA),
+                      HOJA_MUNDIAL: _agrupar(df_bets_m, HOJA_MUNDIAL)}
+            vistos, cambiados = [], []
+            df_res = resultados_vigentes(df_res)
+            if not df_res.empty:
+                for pos, row_res in enumerate(df_res.to_dict('records')):
+                    carrera_id = row_res['carrera']
+                    if not row_res['p1']: continue
+                    res_oficial = resultado_de_fila(row_res)
+                    hoja = HOJA_MUNDIAL if "mundial" in carrera_id else HOJA_CARRERA
+                    bets = grupos[hoja].get(carrera_id)
+                    filas = bets[['usuario', 'datos_encriptados']].values.tolist() if bets is not None else []
+                    cerrado = esta_cerrado(carrera_id)
+                    huella = _huella(res_oficial, cerrado, filas)
+                    clave = (pos, carrera_id)
+                    vistos.append(clave)
+                    anterior = self._eventos.get(clave)
+                    if anterior is None or anterior.huella != huella:
+                        cambiados.append((clave, carrera_id, res_oficial, filas, cerrado, huella))
+            if cambiados:
+                contar("eventos_recalculados", len(cambiados))
+                tokens = [datos for *_, filas, cerrado, _ in cambiados if cerrado for _, datos in filas]
+                lote = descifrador.desencriptar_lote(tokens)
+                for clave, *datos in cambiados:
+                    anterior = self._eventos.get(clave)
+                    if anterior is not None: self._sumar(anterior, -1)
+                    self._eventos[clave] = self._puntuar(*datos, lote)
+                    self._sumar(self._eventos[clave], +1)
+            eliminados = set(self._eventos) - set(vistos)
+            for clave in eliminados:
+                self._sumar(self._eventos.pop(clave), -1)
+            if cambiados or eliminados: self._actualizar_matriz(vistos, [c[0] for c in cambiados])
+            return [self._eventos[c] for c in vistos], dict(self._totales), self._matriz
+
+
+# --- TEMPORADA COMPLETA FUERA DE LA APP (CLI, recálculos nocturnos, auditorías) ---
+def _filtrar_apuestas(df_bets, hoja, eventos):
+    if df_bets.empty: return df_bets
+    return df_bets[df_bets[COLUMNA_EVENTO[hoja]].isin(eventos)]
+
+
+def _clasificar_trozo(df_res, df_bets_c, df_bets_m, cerrados, clave):
+    """Eventos puntuados de unas filas de resultados (se ejecuta en un proceso del pool)."""
+    eventos, _, _ = MotorClasificacion().actualizar(
+        df_res, df_bets_c, df_bets_m, lambda ev: ev in cerrados, Descifrador(clave, hilos=1))
+    return eventos
+
+
+def clasificar_temporada(df_res, df_bets_c, df_bets_m, cerrados, clave, procesos=None):
+    """Clasificacion de una temporada completa a partir de las tablas de las hojas.
+
+    cerrados: conjunto de eventos cerrados (p.ej. de CalendarioCompilado.estados).
+    Las filas de resultados se reparten en trozos seguidos entre `procesos`
+    procesos (por defecto, uno por CPU); cada uno descifra y puntúa los suyos.
+    """
+    df_res = resultados_vigentes(df_res)
+    if df_res.empty: return Clasificacion([], {})
+    procesos = min(procesos or os.cpu_count() or 1, len(df_res))
+    trozos = [df_res.iloc[idx] for idx in np.array_split(np.arange(len(df_res)), procesos)]
+    argumentos = [(trozo, _filtrar_apuestas(df_bets_c, HOJA_CARRERA, set(trozo['carrera'])),
+                   _filtrar_apuestas(df_bets_m, HOJA_MUNDIAL, set(trozo['carrera'])), set(cerrados), clave)
+                  for trozo in trozos]
+    if procesos == 1:
+        partes = [_clasificar_trozo(*a) for a in argumentos]
+    else:
+        with ProcessPoolExecutor(procesos) as pool:
+            partes = list(pool.map(_clasificar_trozo, *zip(*argumentos)))
+    eventos = [ev for parte in partes for ev in parte]
+    ranking = {}
+    for ev in eventos:
+        for user, pts in ev.puntos.items(): ranking[user] = ranking.get(user, 0) + pts
+    columnas = {i: pd.Series(ev.puntos, dtype="int64") for i, ev in enumerate(e for e in eventos if e.cerrado)}
+    matriz = pd.DataFrame(columnas, index=pd.Index(list(ranking), dtype=object)).fillna(0).astype("int64")
+    return Clasificacion(eventos, ranking, matriz)
@@ -0,0 +1,133 @@
+"""Puntúa una temporada completa sin Streamlit, a partir de una exportación en CSV.
+
+Uso (desde la raíz del repositorio):
+
+    python puntuar.py exportacion/                        # clave en .streamlit/secrets.toml
+    python puntuar.py exportacion/ --ahora "30/11/2026 18:00" --procesos 4 --salida auditoria/
+
+`exportacion/` tiene un CSV por pestaña de la hoja (calendario,
+resultados_oficiales, pronosticos_carrera, pronosticos_mundial y, opcional,
+usuarios), tal como los descarga Google Sheets ("<libro> - <pestaña>.csv") o
+simplemente "<pestaña>.csv". Los eventos se reparten entre un pool de procesos
+y se escriben la clasificación global, la de cada liga, el resumen y la tabla
+de cada evento, y la evolución ronda a ronda.
+"""
+import argparse
+import glob
+import os
+import re
+import sys
+import time
+import tomllib
+import unicodedata
+
+import pandas as pd
+
+from almacenamiento import COLUMNAS, HOJA_CALENDARIO, HOJA_CARRERA, HOJA_MUNDIAL, HOJA_RESULTADOS, HOJA_USUARIOS
+from calendario import MADRID, compilar_calendario, parsear_fechas
+from directorio import DirectorioUsuarios
+from puntuacion import clasificar_temporada
+
+HOJAS_OBLIGATORIAS = (HOJA_CALENDARIO, HOJA_RESULTADOS, HOJA_CARRERA, HOJA_MUNDIAL)
+
+
+def leer_exportacion(directorio):
+    """{hoja: DataFrame de texto} con las pestañas encontradas en directorio."""
+    tablas = {}
+    for hoja in HOJAS_OBLIGATORIAS + (HOJA_USUARIOS,):
+        candidatos = sorted(glob.glob(os.path.join(glob.escape(directorio), f"*{hoja}.csv")))
+        exacto = os.path.join(directorio, f"{hoja}.csv")
+        ruta = exacto if os.path.exists(exacto) else (candidatos[0] if candidatos else None)
+        if ruta is None:
+            if hoja in HOJAS_OBLIGATORIAS: raise FileNotFoundError(f"Falta {hoja}.csv en {directorio}")
+            continue
+        df = pd.read_csv(ruta, dtype=str, keep_default_na=False)
+        tablas[hoja] = df if not df.empty else pd.DataFrame(columns=COLUMNAS.get(hoja, df.columns))
+    return tablas
+
+
+def leer_clave(clave=None, secretos=".streamlit/secrets.toml"):
+    """--clave, PORRA_CLAVE o [encryption_key] value de secrets.toml, en ese orden."""
+    clave = clave or os.environ.get("PORRA_CLAVE")
+    if clave: return clave.encode()
+    try:
+        with open(secretos, "rb") as f:
+            return tomllib.load(f)["encryption_key"]["value"].encode()
+    except (OSError, KeyError, tomllib.TOMLDecodeError):
+        raise SystemExit(f"Sin clave de cifrado: usa --clave, PORRA_CLAVE o {secretos}")
+
+
+def _con_posicion(ranking):
+    """Ranking ya ordenado -> con columna Posición (empates comparten puesto)."""
+    return ranking.assign(Posición=ranking["Puntos"].rank(method="min", ascending=False).astype(int))[
+        ["Posición", "Piloto", "Puntos"]]
+
+
+def ficheros_ligas(ligas):
+    """{liga: nombre de fichero seguro}. Los nombres los eligen los usuarios: se
+    quedan en letras, números, '-' y '_', y si dos coinciden se numeran."""
+    ficheros, usados = {}, set()
+    for liga in sorted(ligas):
+        base = unicodedata.normalize("NFKD", liga).encode("ascii", "ignore").decode()
+        base = re.sub(r"[^A-Za-z0-9_-]+", "_", base).strip("_-") or "liga"
+        nombre, n = base, 1
+        while nombre.lower() in usados:          # también en sistemas que no distinguen mayúsculas
+            n += 1
+            nombre = f"{base}-{n}"
+        if nombre != liga: print(f"Liga {liga!r} -> ligas/{nombre}.csv", file=sys.stderr)
+        usados.add(nombre.lower())
+        ficheros[liga] = nombre
+    return ficheros
+
+
+def escribir(clasificacion, directorio_usuarios, salida):
+    os.makedirs(os.path.join(salida, "eventos"), exist_ok=True)
+    _con_posicion(clasificacion.ranking).to_csv(os.path.join(salida, "clasificacion.csv"), index=False)
+    clasificacion.resumen.to_csv(os.path.join(salida, "resumen_eventos.csv"), index=False)
+    for ev in clasificacion.eventos:
+        ev.tabla().to_csv(os.path.join(salida, "eventos", f"{ev.carrera_id}.csv"), index=False)
+    acumulado, posiciones = clasificacion.historial.de()
+    acumulado.to_csv(os.path.join(salida, "historial_puntos.csv"), index_label="Piloto")
+    posiciones.to_csv(os.path.join(salida, "historial_posiciones.csv"), index_label="Piloto")
+    if directorio_usuarios is not None and directorio_usuarios.ligas:
+        os.makedirs(os.path.join(salida, "ligas"), exist_ok=True)
+        for liga, fichero in ficheros_ligas(directorio_usuarios.ligas).items():
+            ranking = clasificacion.ranking_de(directorio_usuarios.miembros_de(liga))
+            _con_posicion(ranking).to_csv(os.path.join(salida, "ligas", f"{fichero}.csv"), index=False)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Puntúa una temporada de la porra desde CSV")
+    parser.add_argument("exportacion", help="directorio con un CSV por pestaña de la hoja")
+    parser.add_argument("--salida", default="clasificacion_porra")
+    parser.add_argument("--ahora", help="'dd/mm/aaaa hh:mm' (Europe/Madrid); por defecto, ahora")
+    parser.add_argument("--procesos", type=int, default=None, help="por defecto, uno por CPU")
+    parser.add_argument("--clave", help="clave Fernet de las apuestas (o PORRA_CLAVE)")
+    parser.add_argument("--secretos", default=".streamlit/secrets.toml")
+    args = parser.parse_args(argv)
+
+    ahora = None
+    if args.ahora:
+        ahora = parsear_fechas(pd.Series([args.ahora])).iloc[0]
+        if pd.isna(ahora): parser.error(f"--ahora no es una fecha válida: {args.ahora}")
+    clave = leer_clave(args.clave, args.secretos)
+    tablas = leer_exportacion(args.exportacion)
+
+    inicio = time.perf_counter()
+    calendario = compilar_calendario(tablas[HOJA_CALENDARIO])
+    cerrados = {ev for ev, estado in calendario.estados(ahora).items() if estado == "CERRADO"}
+    clasificacion = clasificar_temporada(tablas[HOJA_RESULTADOS], tablas[HOJA_CARRERA], tablas[HOJA_MUNDIAL],
+                                         cerrados, clave, args.procesos)
+    usuarios = tablas.get(HOJA_USUARIOS)
+    escribir(clasificacion, DirectorioUsuarios(usuarios) if usuarios is not None else None, args.salida)
+
+    momento = (ahora or pd.Timestamp.now(tz=MADRID)).strftime("%d/%m/%Y %H:%M")
+    print(f"{len(clasificacion.eventos)} eventos, {len(clasificacion.ranking)} jugadores "
+          f"({len(cerrados)} eventos cerrados a {momento}) en {time.perf_counter() - inicio:.1f} s")
+    if clasificacion.corruptos:
+        print(f"⚠️ {clasificacion.corruptos} apuestas no se pudieron descifrar y no puntúan.", file=sys.stderr)
+    print(f"Guardado en {args.salida}/")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+"""AlmacenSheets contra el Sheets falso de benchmarks/: sincronización incremental y upserts."""
+import pytest
+
+import almacenamiento
+from almacenamiento import (COLUMNAS, HOJA_CARRERA, HOJA_RESULTADOS, HOJA_USUARIOS, Almacen, AlmacenSheets,
+                            IndiceFilas, AlmacenSQLite)
+from benchmarks.sheets_falso import ClienteFalso, ErrorFalso, LibroFalso
+from puntuacion import resultados_vigentes
+
+APUESTAS = [["ana", "gp_01", "01/03/2026 10:00", "t1"], ["bea", "gp_01", "01/03/2026 11:00", "t2"],
+            ["cris", "gp_01", "01/03/2026 12:00", "t3"]]
+
+
+def _almacen(hojas):
+    libro = LibroFalso({h: [COLUMNAS[h]] + [list(f) for f in filas] for h, filas in hojas.items()})
+    return AlmacenSheets(None, cliente=ClienteFalso(libro)), libro
+
+
+def _espiar(libro):
+    """Lista con los rangos de cada values:batchGet que se haga a partir de ahora."""
+    pedidos, original = [], libro.values_batch_get
+    def espia(rangos, params=None):
+        pedidos.append(list(rangos))
+        return original(rangos, params)
+    libro.values_batch_get = espia
+    return pedidos
+
+
+def _filas(df):
+    return df.values.tolist()
+
+
+def _hoja(libro, hoja):
+    return libro.worksheet(hoja).filas[1:]
+
+
+# --- INTERFAZ ---
+def test_un_motor_incompleto_falla_al_crearse():
+    class SoloLectura(Almacen):
+        def leer_hoja(self, hoja): return None
+    with pytest.raises(TypeError, match="guardar_resultados_lote"):
+        SoloLectura()
+    AlmacenSheets(None, cliente=ClienteFalso(LibroFalso({})))
+    AlmacenSQLite()
+
+
+# --- SINCRONIZACIÓN INCREMENTAL ---
+def test_solo_pide_las_filas_nuevas():
+    a, libro = _almacen({HOJA_CARRERA: APUESTAS})
+    a.sincronizar_hoja(HOJA_CARRERA)
+    pedidos = _espiar(libro)
+    libro.worksheet(HOJA_CARRERA).append_rows([["dani", "gp_01", "01/03/2026 13:00", "t4"]])   # otro proceso
+    df = a.sincronizar_hoja(HOJA_CARRERA)
+    assert _filas(df) == _hoja(libro, HOJA_CARRERA)
+    assert pedidos == [["'pronosticos_carrera'!A4:D"]]     # desde la última fila conocida (la sonda)
+
+
+def test_sin_cambios_devuelve_lo_mismo():
+    a, _ = _almacen({HOJA_CARRERA: APUESTAS})
+    antes = a.sincronizar_hoja(HOJA_CARRERA)
+    assert _filas(a.sincronizar_hoja(HOJA_CARRERA)) == _filas(antes) == APUESTAS
+
+
+def test_sonda_distinta_fuerza_recarga_completa():
+    a, libro = _almacen({HOJA_CARRERA: APUESTAS})
+    a.sincronizar_hoja(HOJA_CARRERA)
+    ws = libro.worksheet(HOJA_CARRERA)
+    ws.delete_rows(2)                                          # mismo nº de filas, otra última
+    ws.append_rows([["dani", "gp_01", "01/03/2026 13:00", "t4"]])
+    pedidos = _espiar(libro)
+    assert _filas(a.sincronizar_hoja(HOJA_CARRERA)) == _hoja(libro, HOJA_CARRERA)
+    assert pedidos[-1] == ["'pronosticos_carrera'"]
+
+
+def test_hoja_que_encoge_fuerza_recarga_completa():
+    a, libro = _almacen({HOJA_CARRERA: APUESTAS})
+    a.sincronizar_hoja(HOJA_CARRERA)
+    libro.worksheet(HOJA_CARRERA).delete_rows(3)              # la sonda cae fuera de la rejilla
+    assert _filas(a.sincronizar_hoja(HOJA_CARRERA)) == [APUESTAS[0], APUESTAS[2]]
+
+
+def test_relee_las_filas_que_reescribe():
+    a, libro = _almacen({HOJA_CARRERA: APUESTAS})
+    a.sincronizar_hoja(HOJA_CARRERA)
+    a.guardar_apuestas_lote(HOJA_CARRERA, [["bea", "gp_01", "02/03/2026 09:00", "t2b"]])
+    pedidos = _espiar(libro)
+    assert _filas(a.sincronizar_hoja(HOJA_CARRERA))[1] == ["bea", "gp_01", "02/03/2026 09:00", "t2b"]
+    assert pedidos == [["'pronosticos_carrera'!A4:D", "'pronosticos_carrera'!A3:D3"]]
+
+
+def test_reescrituras_ajenas_llegan_con_la_recarga_completa(monkeypatch):
+    a, libro = _almacen({HOJA_CARRERA: APUESTAS})
+    otro = AlmacenSheets(None, cliente=ClienteFalso(libro))
+    a.sincronizar_hoja(HOJA_CARRERA)
+    otro.guardar_apuestas_lote(HOJA_CARRERA, [["ana", "gp_01", "02/03/2026 09:00", "t1b"]])
+    assert _filas(a.sincronizar_hoja(HOJA_CARRERA))[0][3] == "t1"          # vista incremental
+    monkeypatch.setattr(almacenamiento, "INTERVALO_RECARGA_COMPLETA", -1)
+    assert _filas(a.sincronizar_hoja(HOJA_CARRERA))[0][3] == "t1b"
+
+
+def test_lectura_fallida_no_pierde_las_reescritas():
+    a, libro = _almacen({HOJA_USUARIOS: [["ana", "x", "pendiente", ""], ["bea", "y", "user", ""]]})
+    a.sincronizar_hoja(HOJA_USUARIOS)
+    a.actualizar_roles({"ana": "user"})
+    original = libro.values_batch_get
+    def caido(rangos, params=None): raise ErrorFalso(503, "caído")
+    libro.values_batch_get = caido
+    assert a.sincronizar_hoja(HOJA_USUARIOS)['rol'].tolist() == ["pendiente", "user"]   # última copia buena
+    libro.values_batch_get = original
+    assert a.sincronizar_hoja(HOJA_USUARIOS)['rol'].tolist() == ["user", "user"]
+
+
+# --- RESULTADOS ---
+def _motores(filas):
+    a, libro = _almacen({HOJA_RESULTADOS: filas})
+    sqlite = AlmacenSQLite()
+    sqlite.importar(HOJA_RESULTADOS, [almacenamiento.ajustar_resultado(f) for f in filas])
+    return [(a, lambda: _hoja(libro, HOJA_RESULTADOS)),
+            (sqlite, lambda: _filas(sqlite.leer_hoja(HOJA_RESULTADOS)))]
+
+
+@pytest.mark.parametrize("motor", [0, 1], ids=["sheets", "sqlite"])
+def test_upsert_de_resultados_sobre_duplicados_heredados(motor):
+    heredadas = [almacenamiento.ajustar_resultado(f) for f in
+                 (["gp_01", "Alonso"], ["gp_02", "Sainz"], ["gp_01", "Norris"])]
+    almacen, hoja = _motores(heredadas)[motor]
+    almacen.guardar_resultados_lote([["gp_01", "Piastri"], ["gp_03", "Gasly"], ["gp_03", "Albon"]])
+    filas = [f[:2] for f in hoja()]
+    # Se corrige la última fila de gp_01 (la vigente); gp_03 entra una vez, con la última
+    assert filas == [["gp_01", "Alonso"], ["gp_02", "Sainz"], ["gp_01", "Piastri"], ["gp_03", "Albon"]]
+    vigentes = resultados_vigentes(almacen.leer_hoja(HOJA_RESULTADOS))
+    assert vigentes[['carrera', 'p1']].values.tolist() == [["gp_01", "Piastri"], ["gp_02", "Sainz"],
+                                                           ["gp_03", "Albon"]]
+
+
+def test_upsert_de_resultados_no_duplica():
+    a, libro = _almacen({HOJA_RESULTADOS: [almacenamiento.ajustar_resultado(["gp_01", "Alonso"])]})
+    a.guardar_resultado(["gp_01", "Hamilton"])
+    a.guardar_resultado(["gp_01", "Russell"])
+    assert [f[:2] for f in _hoja(libro, HOJA_RESULTADOS)] == [["gp_01", "Russell"]]
+
+
+# --- ÍNDICE DE FILAS ---
+def test_indice_filas():
+    indice = IndiceFilas(2)
+    indice.cargar([["usuario", "carrera"], ["ana", "gp_01"], ["bea", "gp_01"], ["ana", "gp_01"]])
+    assert indice.filas == {("ana", "gp_01"): 2, ("bea", "gp_01"): 3} and indice.ultima == 4
+    indice.anadir(5, [["cris", "gp_02"]])
+    indice.borrar(3)
+    assert indice.filas == {("ana", "gp_01"): 2, ("cris", "gp_02"): 4} and indice.ultima == 4
+    ultima = IndiceFilas(1, ultima_gana=True)
+    ultima.cargar([["carrera"], ["gp_01"], ["gp_01"]])
+    assert ultima.filas == {("gp_01",): 3}
+
+
+def test_actualiza_la_fila_existente_y_anade_las_nuevas():
+    a, libro = _almacen({HOJA_CARRERA: APUESTAS})
+    a.guardar_apuestas_lote(HOJA_CARRERA, [["bea", "gp_01", "f", "t2b"], ["dani", "gp_01", "f", "t4"]])
+    a.guardar_apuestas_lote(HOJA_CARRERA, [["dani", "gp_01", "g", "t4b"]])
+    assert _hoja(libro, HOJA_CARRERA) == [APUESTAS[0], ["bea", "gp_01", "f", "t2b"], APUESTAS[2],
+                                          ["dani", "gp_01", "g", "t4b"]]
+
+
+def test_localiza_tras_un_borrado_ajeno():
+    a, libro = _almacen({HOJA_USUARIOS: [["ana", "x", "user", ""], ["bea", "y", "user", ""],
+                                         ["cris", "z", "pendiente", ""]]})
+    a.leer_hoja(HOJA_USUARIOS)                                  # carga el índice
+    libro.worksheet(HOJA_USUARIOS).delete_rows(2)               # otro proceso borra a ana
+    a.actualizar_roles({"cris": "user"})
+    assert [f[:3] for f in _hoja(libro, HOJA_USUARIOS)] == [["bea", "y", "user"], ["cris", "z", "user"]]
+
+
+def test_localiza_tras_un_borrado_propio():
+    a, libro = _almacen({HOJA_USUARIOS: [["ana", "x", "user", ""], ["bea", "y", "pendiente", ""],
+                                         ["cris", "z", "pendiente", ""]]})
+    a.leer_hoja(HOJA_USUARIOS)
+    a.borrar_usuarios(["bea"])
+    a.actualizar_ligas("cris", "LIGA1")
+    assert _hoja(libro, HOJA_USUARIOS) == [["ana", "x", "user", ""], ["cris", "z", "pendiente", "LIGA1"]]
+    with pytest.raises(KeyError):
+        a.actualizar_roles({"bea": "user"})
+
+
+def test_no_se_salta_filas_que_otro_proceso_anade():
+    a, libro = _almacen({HOJA_USUARIOS: [["ana", "x", "user", ""]]})
+    otro = AlmacenSheets(None, cliente=ClienteFalso(libro))
+    a.leer_hoja(HOJA_USUARIOS)
+    otro.anadir_usuario("bea", "y", "pendiente", "")
+    a.anadir_usuario("cris", "z", "pendiente", "")
+    a.actualizar_roles({"bea": "user", "cris": "user"})
+    assert [f[2] for f in _hoja(libro, HOJA_USUARIOS)] == ["user", "user", "user"]
+    assert a._indices[HOJA_USUARIOS].filas == {("ana",): 2, ("bea",): 3, ("cris",): 4}
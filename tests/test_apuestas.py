@@ -0,0 +1,55 @@
+"""Formato binario de las apuestas: ida y vuelta y lectura de filas antiguas."""
+import random
+
+import pytest
+
+from apuestas import PARRILLA_ACTUAL, PARRILLAS, PILOTOS_2026, codificar, decodificar
+
+
+@pytest.mark.parametrize("k", [0, 1, 3, 10, 21, 22])
+def test_ida_y_vuelta(k):
+    rnd = random.Random(k)
+    for _ in range(50):
+        pilotos = rnd.sample(PILOTOS_2026, k)
+        datos = codificar(pilotos)
+        assert datos[:3] == bytes([1, PARRILLA_ACTUAL, k])
+        assert decodificar(datos) == pilotos
+
+
+def test_parrilla_v1_fija():
+    # Cambiar este orden cambiaría los pilotos de todas las apuestas v1 guardadas
+    assert PARRILLAS[1] == ("Verstappen", "Hadjar", "Leclerc", "Hamilton", "Norris", "Piastri",
+                            "Alonso", "Stroll", "Sainz", "Albon", "Russell", "Antonelli",
+                            "Bearman", "Ocon", "Gasly", "Colapinto", "Lawson", "Lindblad",
+                            "Checo", "Bottas", "Hulkenberg", "Bortoleto")
+    assert decodificar(bytes.fromhex("0101032285")) == ["Bortoleto", "Verstappen", "Checo"]
+    assert PILOTOS_2026 == list(PARRILLAS[PARRILLA_ACTUAL])
+
+
+def test_extremos_del_orden():
+    assert decodificar(codificar(PILOTOS_2026)) == PILOTOS_2026
+    assert decodificar(codificar(PILOTOS_2026[::-1])) == PILOTOS_2026[::-1]
+
+
+def test_tamano():
+    assert len(codificar(PILOTOS_2026[:10])) == 3 + 6
+    assert len(codificar(PILOTOS_2026)) == 3 + 9
+
+
+def test_texto_antiguo():
+    assert decodificar(b"Verstappen,Hadjar,Leclerc") == ["Verstappen", "Hadjar", "Leclerc"]
+    assert decodificar(",".join(PILOTOS_2026).encode()) == PILOTOS_2026
+
+
+@pytest.mark.parametrize("pilotos", [["Verstappen", "Verstappen"], ["Verstappen", "Schumacher"], [""]])
+def test_lo_que_no_encaja_se_guarda_como_texto(pilotos):
+    datos = codificar(pilotos)
+    assert datos == ",".join(pilotos).encode()
+    assert decodificar(datos) == pilotos
+
+
+@pytest.mark.parametrize("datos", [bytes([1]), bytes([1, 99, 3, 0]), bytes([1, 1, 10, 0, 0]),
+                                   bytes([1, 1, 23]) + bytes(9), bytes([1, 1, 1, 22])])
+def test_binario_mal_formado(datos):
+    with pytest.raises(ValueError):
+        decodificar(datos)
@@ -0,0 +1,66 @@
+"""CalendarioCompilado da los mismos estados que el recorrido del DataFrame original."""
+import random
+from datetime import timedelta
+
+import pandas as pd
+import pytest
+
+from calendario import MADRID, CalendarioCompilado, compilar_calendario
+
+
+def verificar_estado_evento(id_evento, df_calendario, ahora):
+    """La versión original de app.py, con `ahora` como parámetro."""
+    idx_evento = df_calendario.index[df_calendario['id_evento'] == id_evento].tolist()
+    if not idx_evento: return 'ERROR'
+    idx = idx_evento[0]
+    evento_actual = df_calendario.iloc[idx]
+    fecha_limite = evento_actual['fecha_dt']
+    if ahora > fecha_limite: return 'CERRADO'
+    if idx == 0: return 'ABIERTO'
+    if id_evento == 'gp_01': evento_previo = df_calendario.iloc[0]
+    else: evento_previo = df_calendario.iloc[idx - 1]
+    fecha_limite_previo = evento_previo['fecha_dt']
+    if ahora < fecha_limite_previo: return 'PENDIENTE'
+    return 'ABIERTO'
+
+
+INICIO = pd.Timestamp("2026-03-01 12:00", tz=MADRID)
+
+
+def _calendario(rnd, n):
+    """Eventos con límites a veces desordenados o repetidos, e ids a veces duplicados."""
+    ids = ["mundial"] + [f"gp_{i:02d}" for i in range(1, n)]
+    if rnd.random() < 0.2: rnd.shuffle(ids)
+    if rnd.random() < 0.3: ids[rnd.randrange(1, n)] = ids[rnd.randrange(n)]
+    fechas = [INICIO + timedelta(days=rnd.choice(range(0, 3 * n, 3))) for _ in range(n)]
+    if rnd.random() < 0.7: fechas.sort()
+    return pd.DataFrame({'id_evento': ids, 'fecha_dt': fechas})
+
+
+@pytest.mark.parametrize("semilla", range(30))
+def test_estado_igual_que_recorrer_el_dataframe(semilla):
+    rnd = random.Random(semilla)
+    df = _calendario(rnd, rnd.randint(1, 12))
+    calendario = CalendarioCompilado(df)
+    instantes = list(df['fecha_dt']) + [INICIO - timedelta(days=1)]
+    instantes += [f + timedelta(seconds=s) for f in df['fecha_dt'] for s in (-1, 1)]
+    for ahora in instantes:
+        for id_evento in list(df['id_evento']) + ['no_existe']:
+            assert calendario.estado(id_evento, ahora) == verificar_estado_evento(id_evento, df, ahora), \
+                (id_evento, ahora)
+
+
+def test_estados_y_epoca():
+    df = pd.DataFrame({'id_evento': ['mundial', 'gp_01', 'gp_02'],
+                       'fecha_limite': ['01/03/2026 12:00', '08/03/2026 12:00:00', '15/03/2026 12:00']})
+    calendario = compilar_calendario(df)
+    ahora = pd.Timestamp("2026-03-05 12:00", tz=MADRID)
+    assert calendario.estados(ahora) == {e: verificar_estado_evento(e, df, ahora) for e in df['id_evento']}
+    assert calendario.estados(ahora) == {'mundial': 'CERRADO', 'gp_01': 'ABIERTO', 'gp_02': 'PENDIENTE'}
+    assert calendario.proximo_cambio(ahora) == df['fecha_dt'][1]
+    assert calendario.epoca(ahora) != calendario.epoca(df['fecha_dt'][1] + timedelta(seconds=1))
+
+
+def test_fecha_invalida_da_error():
+    calendario = compilar_calendario(pd.DataFrame({'id_evento': ['gp_01'], 'fecha_limite': ['mañana']}))
+    assert calendario.estado('gp_01') == 'ERROR'
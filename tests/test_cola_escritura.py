@@ -0,0 +1,93 @@
+"""Cola de escritura diferida: reintentos sin perder la última apuesta y cerrojo entre procesos."""
+import threading
+import time
+
+import pytest
+
+from almacenamiento import HOJA_CARRERA, HOJA_MUNDIAL, AlmacenSQLite
+from cola_escritura import ColaEscrituras
+
+
+class AlmacenInestable(AlmacenSQLite):
+    """Falla las primeras `fallos` escrituras y puede tardar `pausa` segundos en cada una."""
+
+    def __init__(self, fallos=0, pausa=0.0):
+        super().__init__()
+        self.fallos, self.pausa, self.lotes = fallos, pausa, []
+
+    def guardar_apuestas_lote(self, hoja, filas):
+        time.sleep(self.pausa)
+        if self.fallos:
+            self.fallos -= 1
+            raise ConnectionError("Sheets no responde")
+        self.lotes.append((hoja, list(filas)))
+        super().guardar_apuestas_lote(hoja, filas)
+
+
+@pytest.fixture
+def ruta(tmp_path):
+    return str(tmp_path / "cola.db")
+
+
+def _apuestas(almacen, hoja=HOJA_CARRERA):
+    return almacen.leer_hoja(hoja).values.tolist()
+
+
+def test_fallo_y_reintento_conservan_la_ultima_apuesta(ruta):
+    almacen = AlmacenInestable(fallos=1)
+    cola = ColaEscrituras(almacen, ruta)
+    cola.encolar(HOJA_CARRERA, "ana", "gp_01", "f1", "t1")
+    cola.encolar(HOJA_CARRERA, "ana", "gp_01", "f2", "t2")
+    with pytest.raises(ConnectionError):
+        cola.volcar()
+    assert cola.num_pendientes() == 2 and cola.pendiente(HOJA_CARRERA, "ana", "gp_01") == "t2"
+    cola.encolar(HOJA_CARRERA, "ana", "gp_01", "f3", "t3")      # llega mientras se reintenta
+    cola.encolar(HOJA_MUNDIAL, "bea", "mundial", "f4", "m1")
+    assert cola.volcar() == 2
+    assert cola.num_pendientes() == 0 and cola.pendiente(HOJA_CARRERA, "ana", "gp_01") is None
+    assert _apuestas(almacen) == [["ana", "gp_01", "f3", "t3"]]
+    assert _apuestas(almacen, HOJA_MUNDIAL) == [["bea", "mundial", "f4", "m1"]]
+
+
+def test_el_diario_sobrevive_al_proceso(ruta):
+    ColaEscrituras(AlmacenInestable(), ruta).encolar(HOJA_CARRERA, "ana", "gp_01", "f1", "t1")
+    almacen = AlmacenInestable()
+    assert ColaEscrituras(almacen, ruta).volcar() == 1
+    assert _apuestas(almacen) == [["ana", "gp_01", "f1", "t1"]]
+
+
+def test_un_cerrojo_vivo_impide_volcar(ruta):
+    almacen = AlmacenInestable()
+    a, b = ColaEscrituras(almacen, ruta), ColaEscrituras(almacen, ruta)
+    a.encolar(HOJA_CARRERA, "ana", "gp_01", "f1", "t1")
+    assert b._tomar_cerrojo()
+    assert a.volcar() == 0 and a.num_pendientes() == 1
+    b._soltar_cerrojo()
+    assert a.volcar() == 1
+
+
+def test_un_cerrojo_caducado_se_toma(ruta):
+    almacen = AlmacenInestable()
+    muerto = ColaEscrituras(almacen, ruta, duracion_cerrojo=0.1)
+    assert muerto._tomar_cerrojo()                             # y el proceso muere sin soltarlo
+    vivo = ColaEscrituras(almacen, ruta)
+    vivo.encolar(HOJA_CARRERA, "ana", "gp_01", "f1", "t1")
+    assert vivo.volcar() == 0
+    time.sleep(0.2)
+    assert vivo.volcar() == 1
+
+
+def test_el_cerrojo_se_renueva_durante_un_volcado_largo(ruta):
+    a = ColaEscrituras(AlmacenInestable(pausa=0.6), ruta, duracion_cerrojo=0.2)
+    otro = ColaEscrituras(AlmacenInestable(), ruta)
+    a.encolar(HOJA_CARRERA, "ana", "gp_01", "f1", "t1")
+    volcado = threading.Thread(target=a.volcar)
+    volcado.start()
+    vigente = []
+    while volcado.is_alive():
+        time.sleep(0.05)
+        dueno, hasta = otro._con.execute("SELECT dueno, hasta FROM cerrojo").fetchone()
+        if hasta: vigente.append(dueno == a._id and hasta > time.time())   # hasta = 0: ya soltado
+    assert vigente and all(vigente)
+    assert otro._tomar_cerrojo()
+    assert [h for h in threading.enumerate() if h.name == "cerrojo-apuestas"] == []
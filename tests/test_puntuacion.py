@@ -0,0 +1,40 @@
+"""La puntuación vectorizada da los mismos puntos que las reglas originales."""
+import random
+
+import pytest
+
+from apuestas import PILOTOS_2026
+from puntuacion import (calcular_puntos_carrera, calcular_puntos_mundial, puntuar_carrera_lote,
+                        puntuar_mundial_lote)
+
+DESCONOCIDOS = ["Schumacher", "Vettel", ""]
+
+
+def _lista(rnd, largo_max):
+    """Pilotos al azar: a veces repetidos, desconocidos o vacíos, como en filas viejas."""
+    if rnd.random() < 0.7:
+        return rnd.sample(PILOTOS_2026, rnd.randint(0, min(largo_max, len(PILOTOS_2026))))
+    return [rnd.choice(PILOTOS_2026 + DESCONOCIDOS) for _ in range(rnd.randint(0, largo_max))]
+
+
+@pytest.mark.parametrize("semilla", range(20))
+def test_carrera_lote_igual_que_calcular_puntos(semilla):
+    rnd = random.Random(semilla)
+    resultado = _lista(rnd, 22)
+    predicciones = [_lista(rnd, 12) for _ in range(200)]
+    esperado = [calcular_puntos_carrera(p, resultado) for p in predicciones]
+    assert puntuar_carrera_lote(predicciones, resultado).tolist() == esperado
+
+
+@pytest.mark.parametrize("semilla", range(20))
+def test_mundial_lote_igual_que_calcular_puntos(semilla):
+    rnd = random.Random(semilla)
+    resultado = _lista(rnd, 24)
+    predicciones = [_lista(rnd, 24) for _ in range(200)]
+    esperado = [calcular_puntos_mundial(p, resultado) for p in predicciones]
+    assert puntuar_mundial_lote(predicciones, resultado).tolist() == esperado
+
+
+def test_lote_vacio():
+    assert puntuar_carrera_lote([], PILOTOS_2026).tolist() == []
+    assert puntuar_mundial_lote([], PILOTOS_2026).tolist() == []
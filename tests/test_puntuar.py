@@ -0,0 +1,17 @@
+"""Nombres de fichero de las ligas en la salida de puntuar.py."""
+import re
+
+from puntuar import ficheros_ligas
+
+
+def test_nombres_de_liga_seguros_y_distintos():
+    ligas = ["LIGA A", "../../etc", "A/B", "A_B", "PEÑA", "..", "x", "X", "", "C:\\tmp"]
+    ficheros = ficheros_ligas(ligas)
+    assert set(ficheros) == set(ligas)
+    assert all(re.fullmatch(r"[A-Za-z0-9_-]+", f) for f in ficheros.values())
+    assert len({f.lower() for f in ficheros.values()}) == len(ligas)
+    assert ficheros["PEÑA"] == "PENA"
+
+
+def test_nombres_validos_no_cambian():
+    assert ficheros_ligas(["LIGA0001", "AMIGOS_2026"]) == {"LIGA0001": "LIGA0001", "AMIGOS_2026": "AMIGOS_2026"}